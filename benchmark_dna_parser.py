@@ -0,0 +1,70 @@
+#!/usr/bin/env python3
+"""Micro-benchmark: line-by-line DNA file parsing vs the byte-level scanner."""
+import argparse
+import logging
+import random
+import time
+
+from services.hla_service import HLAService
+
+CHROMOSOMES = [str(c) for c in range(1, 23)] + ['X', 'Y', 'MT']
+CHUNK_BYTES = 1024 * 1024
+
+
+def raw_genome(rng: random.Random, rows: int, shuffle: bool = False) -> bytes:
+    """23andMe-style export: chromosomes in order, ascending positions."""
+    per_chrom = rows // len(CHROMOSOMES)
+    lines = []
+    for chrom in CHROMOSOMES:
+        for position in sorted(rng.sample(range(1, 150_000_000), per_chrom)):
+            genotype = rng.choice('ACGT') + rng.choice('ACGT')
+            lines.append(f"rs{rng.randrange(1, 10 ** 8)}\t{chrom}\t{position}\t{genotype}")
+    if shuffle:
+        rng.shuffle(lines)
+    return ("# rsid\tchromosome\tposition\tgenotype\n" + "\n".join(lines) + "\n").encode()
+
+
+def line_parser(service: HLAService, data: bytes) -> list:
+    """Decode everything, split into lines and parse each one (the old _parse_csv_format)."""
+    snps = []
+    for line in data.decode('utf-8').strip().split('\n'):
+        snp = service._parse_csv_line(line)
+        if snp is not None:
+            snps.append(snp)
+    return snps
+
+
+def byte_parser(service: HLAService, data: bytes) -> list:
+    """Feed the upload in chunks, as /api/upload-dna does."""
+    parser = service.stream_parser()
+    for start in range(0, len(data), CHUNK_BYTES):
+        parser.feed(data[start:start + CHUNK_BYTES])
+    return parser.close()
+
+
+def timed(fn, repeat: int = 3) -> float:
+    best = float('inf')
+    for _ in range(repeat):
+        started = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - started)
+    return best
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--rows", type=int, default=600_000)
+    args = parser.parse_args()
+    logging.disable(logging.INFO)
+
+    rng = random.Random(42)
+    service = HLAService()
+    for label, shuffle in (("sorted", False), ("shuffled", True)):
+        data = raw_genome(rng, args.rows, shuffle=shuffle)
+        lines = timed(lambda: line_parser(service, data))
+        scanned = timed(lambda: byte_parser(service, data))
+        print(f"📊 {label.capitalize()} file ({len(data) / 1024 / 1024:.1f} MB, {args.rows:,} rows)")
+        print(f"   line parser:   {lines * 1000:9.2f} ms")
+        print(f"   byte scanner:  {scanned * 1000:9.2f} ms  ({lines / scanned:.0f}x)")
+        assert line_parser(service, data) == byte_parser(service, data), f"byte scanner disagrees on the {label} file"
+    print("✅ Results identical")
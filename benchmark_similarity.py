@@ -0,0 +1,53 @@
+#!/usr/bin/env python3
+"""Micro-benchmark: pairwise calculate_perceived_similarity vs the array API."""
+import argparse
+import random
+import time
+
+import numpy as np
+
+from services.similarity_service import SimilarityService, TRAITS
+
+
+def random_profile(rng: random.Random) -> dict:
+    return {t: {'score': round(rng.uniform(0, 20), 1)} for t in TRAITS}
+
+
+def timed(fn, repeat: int = 3) -> float:
+    best = float('inf')
+    for _ in range(repeat):
+        started = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - started)
+    return best
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--profiles", type=int, default=1000)
+    args = parser.parse_args()
+
+    rng = random.Random(42)
+    service = SimilarityService()
+    profiles = [random_profile(rng) for _ in range(args.profiles)]
+    me = profiles[0]
+    matrix = service.trait_matrix(profiles)
+    pairs = args.profiles * args.profiles
+
+    one_loop = timed(lambda: [service.calculate_perceived_similarity(me, p) for p in profiles])
+    one_array = timed(lambda: service.similarity_one_to_many(matrix[0], matrix))
+    print(f"📊 One-to-many ({args.profiles} profiles)")
+    print(f"   pairwise loop: {one_loop * 1000:9.2f} ms")
+    print(f"   array API:     {one_array * 1000:9.2f} ms  ({one_loop / one_array:.0f}x)")
+
+    sample = profiles[:max(1, min(args.profiles, 200))]
+    many_loop = timed(lambda: [[service.calculate_perceived_similarity(a, b) for b in profiles] for a in sample], repeat=1)
+    many_loop *= args.profiles / len(sample)  # Extrapolated from the sampled rows
+    many_array = timed(lambda: service.similarity_many_to_many(matrix, matrix), repeat=1)
+    print(f"📊 Many-to-many ({pairs:,} pairs)")
+    print(f"   pairwise loop: {many_loop * 1000:9.2f} ms  (extrapolated)")
+    print(f"   array API:     {many_array * 1000:9.2f} ms  ({many_loop / many_array:.0f}x)")
+
+    expected = np.array([service.calculate_perceived_similarity(me, p) for p in profiles])
+    assert np.array_equal(expected, service.similarity_one_to_many(matrix[0], matrix)), "array API disagrees with pairwise"
+    print("✅ Results identical")
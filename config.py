@@ -3,7 +3,14 @@ Configuration - Loads settings from environment variables
 Compatible with Cloudflare + Zoho Mail + Contabo deployment
 """
 
+import importlib
 import os
+import sys
+
+try:
+    from dotenv import load_dotenv
+except ImportError:  # Optional: without python-dotenv only the process environment is read
+    load_dotenv = None
 
 class Config:
     """Configuration class for Harmonia."""
@@ -66,6 +73,28 @@ class Config:
     REQUEST_TIMEOUT = 180  # 3 minutes for complex analysis
     GENERATION_TIMEOUT = 90  # 90 seconds for generation
 
+    # Max quiz scoring calls in flight per profile submission
+    PARSE_CONCURRENCY = int(os.getenv('PARSE_CONCURRENCY', '8'))
+    # Answers scored per model call (capped by the output token budget)
+    PARSE_BATCH_SIZE = int(os.getenv('PARSE_BATCH_SIZE', '20'))
+    # parse_response score cache: in-memory LRU (+ optional SQLite file shared by workers)
+    PARSE_CACHE_SIZE = int(os.getenv('PARSE_CACHE_SIZE', '10000'))
+    PARSE_CACHE_TTL = int(os.getenv('PARSE_CACHE_TTL', str(7 * 24 * 3600)))
+    PARSE_CACHE_PATH = os.getenv('PARSE_CACHE_PATH', '')  # empty = memory only
+    # Pre-generated /api/generate-response answers per (question, tone)
+    RESPONSE_POOL_ENABLED = os.getenv('RESPONSE_POOL_ENABLED', 'true').lower() == 'true'
+    RESPONSE_POOL_PREWARM = os.getenv('RESPONSE_POOL_PREWARM', 'true').lower() == 'true'
+    RESPONSE_POOL_PER_KEY = int(os.getenv('RESPONSE_POOL_PER_KEY', '3'))
+    RESPONSE_POOL_CONCURRENCY = int(os.getenv('RESPONSE_POOL_CONCURRENCY', '4'))
+    # Stream the full analysis and surface each narrative field as it completes
+    STREAM_ANALYSIS = os.getenv('STREAM_ANALYSIS', 'true').lower() == 'true'
+    # Threads reserved for blocking Gemini SDK calls (calls in flight per worker)
+    LLM_MAX_WORKERS = int(os.getenv('LLM_MAX_WORKERS', '32'))
+    # Threads for CPU-bound analyze stages (DOCX report, large HLA comparisons)
+    COMPUTE_MAX_WORKERS = int(os.getenv('COMPUTE_MAX_WORKERS', str(min(4, os.cpu_count() or 1))))
+    # Processes for parsing very large DNA files across cores
+    PARSE_PROCESS_WORKERS = int(os.getenv('PARSE_PROCESS_WORKERS', str(min(4, os.cpu_count() or 1))))
+
     # ==================== DOMAIN & URL CONFIGURATION ====================
     # Your domain (set via Cloudflare)
     DOMAIN = os.getenv('DOMAIN', 'yourdomain.com')
@@ -125,6 +154,9 @@ class Config:
     REQUIRE_API_KEY = os.getenv('REQUIRE_API_KEY', 'false').lower() == 'true'
     API_KEYS = os.getenv('API_KEYS', '').split(',') if os.getenv('API_KEYS') else []
 
+    # POST /api/admin/reload needs this in X-Admin-Token (endpoint disabled when empty)
+    ADMIN_TOKEN = os.getenv('ADMIN_TOKEN', '')
+
     # ==================== STORAGE CONFIGURATION ====================
     # File storage paths
     DATA_DIR = os.getenv('DATA_DIR', './data')
@@ -133,7 +165,10 @@ class Config:
 
     # Maximum file sizes (in MB)
     MAX_IMAGE_SIZE_MB = int(os.getenv('MAX_IMAGE_SIZE_MB', '10'))
-    MAX_DNA_FILE_SIZE_MB = int(os.getenv('MAX_DNA_FILE_SIZE_MB', '5'))
+    # DNA uploads: applies to the upload and to the decompressed text of .zip/.gz files
+    MAX_DNA_FILE_SIZE_MB = int(os.getenv('MAX_DNA_FILE_SIZE_MB', '200'))
+    # Unsorted DNA files at least this large are parsed on the process pool
+    DNA_PARALLEL_MIN_MB = int(os.getenv('DNA_PARALLEL_MIN_MB', '32'))
 
     # ==================== CLOUDFLARE CONFIGURATION ====================
     # Cloudflare settings (optional but recommended)
@@ -154,7 +189,51 @@ class Config:
     print(f"📝 Logging: {LOG_LEVEL} → {LOG_FILE}")
 
     # ==================== DATABASE CONFIGURATION ====================
-    # Optional: Add database configuration if needed in future
-    # DATABASE_URL = os.getenv('DATABASE_URL', '')
+    # State store for profiles, photos, HLA data and report paths
+    # memory: per-process dicts (single worker only) | sqlite: shared by all workers
+    STORAGE_BACKEND = os.getenv('STORAGE_BACKEND', 'memory')
+    STORAGE_PATH = os.getenv('STORAGE_PATH', './storage/harmonia.db')
+
+    # Background /api/analyze/async jobs run at once per worker
+    ANALYZE_JOB_CONCURRENCY = int(os.getenv('ANALYZE_JOB_CONCURRENCY', '2'))
+    # Seconds without a heartbeat before a running job is re-queued; seconds finished jobs are kept
+    ANALYZE_JOB_STALE_SECONDS = int(os.getenv('ANALYZE_JOB_STALE_SECONDS', '120'))
+    ANALYZE_JOB_RETENTION_SECONDS = int(os.getenv('ANALYZE_JOB_RETENTION_SECONDS', '86400'))
+
+    # /api/matches: index refresh interval, KD-tree threshold, nearest neighbours scored first on the KD-tree path
+    MATCH_INDEX_TTL = int(os.getenv('MATCH_INDEX_TTL', '60'))
+    MATCH_KDTREE_MIN = int(os.getenv('MATCH_KDTREE_MIN', '100000'))
+    MATCH_SHORTLIST = int(os.getenv('MATCH_SHORTLIST', '500'))
+
+    # Per-user top match lists: list length, seconds to collect changes into one update batch,
+    # seconds before another worker takes over updating from one that stopped renewing its lease
+    TOP_MATCHES_K = int(os.getenv('TOP_MATCHES_K', '20'))
+    TOP_MATCHES_BATCH_DELAY = float(os.getenv('TOP_MATCHES_BATCH_DELAY', '2'))
+    TOP_MATCHES_LEASE_SECONDS = float(os.getenv('TOP_MATCHES_LEASE_SECONDS', '30'))
+
+    # Decoded HLA SNP arrays kept in memory (~14 bytes per SNP each)
+    HLA_ARRAY_CACHE_SIZE = int(os.getenv('HLA_ARRAY_CACHE_SIZE', '512'))
+
+    # /api/cohort/matrix: largest cohort accepted, rows x columns scored per block
+    COHORT_MAX_SIZE = int(os.getenv('COHORT_MAX_SIZE', '2000'))
+    COHORT_BLOCK_SIZE = int(os.getenv('COHORT_BLOCK_SIZE', '512'))
+
+    print(f"🗄️  Storage: {STORAGE_BACKEND}" + (f" → {STORAGE_PATH}" if STORAGE_BACKEND == 'sqlite' else ""))
 
     print("\n✅ Configuration loaded successfully!\n")
+
+
+def reload_config():
+    """
+    Re-read .env and the environment into Config. Class attributes are
+    evaluated once at import, so the module is re-executed and the new values
+    copied onto the existing class (modules holding Config see them).
+    """
+    if load_dotenv is not None:
+        load_dotenv(override=True)
+    current = Config
+    module = importlib.reload(sys.modules[__name__])
+    for name, value in vars(module.Config).items():
+        if not name.startswith('__'):
+            setattr(current, name, value)
+    module.Config = current
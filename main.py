@@ -3,21 +3,26 @@ Main - FLASH with FORCED LONG RESPONSES
 Uses detailed examples to force 70-80 word outputs!
 """
 
-from fastapi import FastAPI, File, UploadFile, HTTPException
-from fastapi.responses import FileResponse, JSONResponse
+from fastapi import FastAPI, File, UploadFile, HTTPException, Depends, Header
+from fastapi.responses import FileResponse, JSONResponse, StreamingResponse
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.staticfiles import StaticFiles
 from pydantic import BaseModel
 from typing import List, Dict, Optional
-import os, sys, traceback
+import os, sys, traceback, asyncio, json, hmac
 
 sys.path.append(os.path.dirname(__file__))
+from config import Config, reload_config
 try:
-    from services.gemini_service import GeminiService
-    from services.similarity_service import SimilarityService
-    from services.visual_service import VisualService
-    from services.hla_service import HLAService
-    from services.report_service import ReportService
+    from services.container import ServiceContainer
+    from services.storage_service import create_storage
+    from services.job_service import JobQueue
+    from services.compute_service import run_compute, shutdown_compute_executor, get_process_executor
+    from services.cache_service import get_parse_cache, content_key
+    from services.response_pool_service import ResponsePool
+    from services.match_service import MatchIndex, TopMatchLists, compatibility_matrix
+    from services.hla_service import DNAFileTooLarge, DNAArchiveError
+    from services.llm_service import run_llm_call, shutdown_llm_executor, configure_genai, get_model, clear_model_cache
     print("✅ Services imported")
 except Exception as e:
     print(f"❌ {e}")
@@ -25,7 +30,16 @@ except Exception as e:
 app = FastAPI(title="Harmonia")
 app.add_middleware(CORSMiddleware, allow_origins=["*"], allow_credentials=True, allow_methods=["*"], allow_headers=["*"])
 
-PROFILES_DB, IMAGES_DB, HLA_DB, REPORTS_DB = {}, {}, {}, {}
+# Shared state (STORAGE_BACKEND=sqlite to share it across workers and restarts)
+STORE = create_storage()
+PROFILES_DB, IMAGES_DB, HLA_DB, REPORTS_DB = (STORE.table(n) for n in ("profiles", "images", "hla", "reports"))
+# Last analysis per pair with the fingerprint of its inputs (see _analysis_events)
+ANALYSES_DB = STORE.table("analyses")
+SERVICES = None
+JOBS = None
+RESPONSE_POOL = None
+MATCH_INDEX = None
+TOP_MATCHES = None
 
 @app.on_event("startup")
 async def startup_event():
@@ -52,13 +66,58 @@ async def startup_event():
     os.makedirs("harmonia_outputs", exist_ok=True)
     print("✅ Output directory ready")
 
+    # Build services once for the lifetime of this worker
+    get_services()
+    print("✅ Services ready")
+
+    # Background analysis jobs (state kept in STORE, so restarts resume them)
+    global JOBS
+    JOBS = JobQueue(STORE.table("jobs"), _analysis_job_runner, concurrency=Config.ANALYZE_JOB_CONCURRENCY,
+                    stale_after=Config.ANALYZE_JOB_STALE_SECONDS, retention=Config.ANALYZE_JOB_RETENTION_SECONDS)
+    await JOBS.start()
+
+    # Vectorized top-K match search over all stored profiles
+    global MATCH_INDEX, TOP_MATCHES
+    MATCH_INDEX = MatchIndex(PROFILES_DB, IMAGES_DB, HLA_DB, get_services().hla)
+    TOP_MATCHES = TopMatchLists(STORE.table("top_matches"), MATCH_INDEX, k=Config.TOP_MATCHES_K,
+                                batch_delay=Config.TOP_MATCHES_BATCH_DELAY, lease=Config.TOP_MATCHES_LEASE_SECONDS)
+    await TOP_MATCHES.start()
+
+    # Pre-generated /api/generate-response answers, topped up in the background
+    global RESPONSE_POOL
+    if Config.RESPONSE_POOL_ENABLED:
+        RESPONSE_POOL = ResponsePool(STORE.table("response_pool"), _generate_pool_candidate, "data/felix_questions.json",
+                                     per_key=Config.RESPONSE_POOL_PER_KEY, concurrency=Config.RESPONSE_POOL_CONCURRENCY)
+        if Config.RESPONSE_POOL_PREWARM and gemini_key:
+            asyncio.create_task(RESPONSE_POOL.warm())
+
     print("="*50)
     print("✅ HARMONIA READY")
     print("="*50 + "\n")
 
-def get_services():
-    api_key = os.getenv('GEMINI_API_KEY')
-    return (GeminiService(), SimilarityService(), VisualService(api_key), HLAService(), ReportService())
+@app.on_event("shutdown")
+async def shutdown_event():
+    if JOBS:
+        await JOBS.stop()
+    if TOP_MATCHES:
+        await TOP_MATCHES.stop()
+    shutdown_llm_executor()
+    shutdown_compute_executor()
+
+def get_services() -> ServiceContainer:
+    """FastAPI dependency: the process-wide service container."""
+    global SERVICES
+    if SERVICES is None:
+        SERVICES = ServiceContainer()
+        # Model handles are bound to the old key / model, parse results to the old model
+        SERVICES.add_reload_hook(clear_model_cache)
+        SERVICES.add_reload_hook(get_parse_cache().clear)
+    return SERVICES
+
+def reload_services():
+    """Rebuild services after a config change (new API key, GEMINI_MODEL, ...)."""
+    reload_config()
+    get_services().reload()
 
 class ProfileRequest(BaseModel):
     user_id: str
@@ -74,6 +133,9 @@ class ResponseGeneratorRequest(BaseModel):
     question: str
     tone: str
 
+class CohortRequest(BaseModel):
+    user_ids: List[str]
+
 @app.get("/api/health")
 async def health():
     """Health check endpoint for Railway."""
@@ -87,6 +149,23 @@ async def health():
     except Exception as e:
         raise HTTPException(500, f"Unhealthy: {str(e)}")
 
+@app.post("/api/admin/reload")
+async def admin_reload(x_admin_token: str = Header("")):
+    """Re-read .env / the environment and rebuild services without a restart."""
+    if not Config.ADMIN_TOKEN or not hmac.compare_digest(x_admin_token.encode(), Config.ADMIN_TOKEN.encode()):
+        raise HTTPException(403, "Admin endpoint disabled or token invalid")
+    await run_compute(reload_services)
+    return {"status": "reloaded"}
+
+@app.get("/api/stats/cache")
+async def cache_stats():
+    """Hit/miss counters for the result caches."""
+    return {
+        "parse_response": get_parse_cache().stats(),
+        "response_pool": RESPONSE_POOL.stats() if RESPONSE_POOL else None,
+        "top_matches": TOP_MATCHES.stats() if TOP_MATCHES else None
+    }
+
 def _extract_text_safely_from_response(response) -> str:
     """Safely extract text from Gemini response, handling blocked/empty responses."""
     try:
@@ -127,10 +206,9 @@ def _extract_text_safely_from_response(response) -> str:
         print(f"⚠️  Error extracting text: {e}")
         return None
 
-@app.post("/api/generate-response")
-async def generate_response(request: ResponseGeneratorRequest):
+async def _generate_live_response(question: str, tone: str) -> dict:
     """FORCE 70-80 word responses with detailed examples!"""
-    print(f"\n🤖 GEN: {request.question[:50]}... ({request.tone})")
+    print(f"\n🤖 GEN: {question[:50]}... ({tone})")
 
     # 80-word fallbacks
     fb = {
@@ -140,8 +218,7 @@ async def generate_response(request: ResponseGeneratorRequest):
     }
 
     try:
-        import google.generativeai as genai
-        genai.configure(api_key=os.getenv('GEMINI_API_KEY'))
+        configure_genai(os.getenv('GEMINI_API_KEY'))
 
         safety = [{"category": c, "threshold": "BLOCK_NONE"} for c in ["HARM_CATEGORY_HARASSMENT", "HARM_CATEGORY_HATE_SPEECH", "HARM_CATEGORY_SEXUALLY_EXPLICIT", "HARM_CATEGORY_DANGEROUS_CONTENT"]]
         
@@ -157,12 +234,12 @@ async def generate_response(request: ResponseGeneratorRequest):
         # FORCE LENGTH with explicit instructions + example + SAFETY GUARDRAILS
         prompt = f"""You are helping someone answer a personality assessment question. Generate a thoughtful, honest response that reflects personal values and decision-making style.
 
-QUESTION: "{request.question}"
+QUESTION: "{question}"
 
-TONE GUIDANCE: {request.tone} (balanced, thoughtful, authentic)
+TONE GUIDANCE: {tone} (balanced, thoughtful, authentic)
 
 EXAMPLE RESPONSE STYLE:
-{tone_examples.get(request.tone, tone_examples['neutral'])}
+{tone_examples.get(tone, tone_examples['neutral'])}
 
 Now generate a SIMILAR LENGTH response (70-80 words like the example above) that:
 - Is thoughtful, honest, and balanced
@@ -179,11 +256,9 @@ Write ONLY the response (no preamble, no quotation marks):"""
 
         # Use model from environment or default to Gemini 3 Flash (fast with Pro reasoning)
         model_name = os.getenv('GEMINI_MODEL', 'gemini-3-flash-preview')
-        model = genai.GenerativeModel(model_name)
-
-        # BALANCED settings for safe, consistent output
-        response = model.generate_content(
-            prompt,
+        # BALANCED settings for safe, consistent output (cached handle per model + settings)
+        model = get_model(
+            model_name,
             generation_config={
                 'temperature': 0.7,  # Lower temperature for safer, more predictable output
                 'max_output_tokens': 400,
@@ -193,14 +268,15 @@ Write ONLY the response (no preamble, no quotation marks):"""
             },
             safety_settings=safety
         )
+        response = await run_llm_call(model.generate_content, prompt)
 
         text = _extract_text_safely_from_response(response)
 
         # If empty response, use fallback immediately
         if not text:
             print(f"❌ Empty response from Gemini API, using fallback")
-            t = fb.get(request.tone, fb['neutral'])
-            return JSONResponse({"status": "fallback", "response": t, "word_count": len(t.split()), "reason": "empty_response"})
+            t = fb.get(tone, fb['neutral'])
+            return {"status": "fallback", "response": t, "word_count": len(t.split()), "reason": "empty_response"}
 
         # Remove quotes if model added them
         if text.startswith('"') and text.endswith('"'):
@@ -239,38 +315,70 @@ Write ONLY the response (no preamble, no quotation marks):"""
         final = len(words)
         print(f"✅ FINAL: {final} words\n")
         
-        return JSONResponse({"status": "generated", "response": text, "word_count": final, "model_used": "gemini-2.5-flash"})
+        return {"status": "generated", "response": text, "word_count": final, "model_used": model_name}
                 
     except Exception as e:
         print(f"❌ ERROR: {e}")
         traceback.print_exc()
-        t = fb.get(request.tone, fb['neutral'])
-        return JSONResponse({"status": "fallback", "response": t, "word_count": len(t.split())})
+        t = fb.get(tone, fb['neutral'])
+        return {"status": "fallback", "response": t, "word_count": len(t.split())}
+
+async def _generate_pool_candidate(question: str, tone: str):
+    """Live generation for the response pool; canned fallbacks are not pooled."""
+    result = await _generate_live_response(question, tone)
+    if result["status"] != "generated":
+        return None
+    return {"response": result["response"], "model_used": result["model_used"]}
+
+@app.post("/api/generate-response")
+async def generate_response(request: ResponseGeneratorRequest):
+    """Serve a pre-generated answer when one is pooled, else generate live."""
+    pooled = RESPONSE_POOL.take(request.question, request.tone) if RESPONSE_POOL else None
+    if pooled:
+        if isinstance(pooled, str):  # Pooled before the model was recorded with it
+            pooled = {"response": pooled, "model_used": None}
+        text = pooled["response"]
+        return JSONResponse({"status": "generated", "response": text, "word_count": len(text.split()),
+                             "model_used": pooled["model_used"], "source": "pool"})
+    return JSONResponse(await _generate_live_response(request.question, request.tone))
 
 @app.post("/api/upload-image/{user_id}")
-async def upload_image(user_id: str, file: UploadFile = File(...)):
-    s = get_services()
+async def upload_image(user_id: str, file: UploadFile = File(...), s: ServiceContainer = Depends(get_services)):
     c = await file.read()
-    f = s[2].extract_features(c)
+    f = await s.visual.extract_features_async(c)
     IMAGES_DB[user_id] = {"features": f, "filename": file.filename}
+    _profile_changed(user_id)
     return {"status": "uploaded", "features": f}
 
 @app.post("/api/upload-dna/{user_id}")
-async def upload_dna(user_id: str, file: UploadFile = File(...)):
-    s = get_services()
-    c = await file.read()
-    p = s[3].parse_hla_input(c.decode('utf-8'))
-    HLA_DB[user_id] = p
+async def upload_dna(user_id: str, file: UploadFile = File(...), s: ServiceContainer = Depends(get_services)):
+    # Plain, .gz or .zip; decompressed and parsed in chunks, only HLA-region rows are kept
+    limit = Config.MAX_DNA_FILE_SIZE_MB * 1024 * 1024
+    if file.size is not None and file.size > limit:
+        raise HTTPException(413, f"DNA file larger than {Config.MAX_DNA_FILE_SIZE_MB} MB")
+    try:
+        p = await run_compute(s.hla.parse_dna_file, file.file, max_bytes=limit, executor=get_process_executor(),
+                              parallel_min_bytes=Config.DNA_PARALLEL_MIN_MB * 1024 * 1024)
+    except DNAFileTooLarge:
+        raise HTTPException(413, f"DNA file larger than {Config.MAX_DNA_FILE_SIZE_MB} MB")
+    except DNAArchiveError as e:
+        raise HTTPException(400, str(e))
+    except UnicodeDecodeError:
+        raise HTTPException(400, "DNA file must be UTF-8 text")
+    HLA_DB[user_id] = s.hla.to_storage(p)
+    _profile_changed(user_id)
     return {"status": "uploaded", "snps_extracted": len(p) if p else 0}
 
 @app.post("/api/submit-profile")
-async def submit_profile(request: ProfileRequest):
-    s = get_services()
+async def submit_profile(request: ProfileRequest, s: ServiceContainer = Depends(get_services)):
     traits = {x: {'score': 0, 'evidence': ''} for x in ["drive", "confidence", "passion", "assertiveness", "indulgence", "aspiration", "ease"]}
 
-    for r in request.responses:
-        res = await s[0].parse_response(r['question'], r['answer'])
+    pairs = [(r['question'], r['answer']) for r in request.responses]
+    results = await s.gemini.parse_responses_batch(pairs, max_concurrency=Config.PARSE_CONCURRENCY)
+    for res in results:
         for trait, data in res.items():
+            if trait not in traits or not isinstance(data, dict):
+                continue
             traits[trait]['score'] += data.get('score', 0)
             if data.get('evidence'):
                 traits[trait]['evidence'] = data['evidence']
@@ -281,39 +389,124 @@ async def submit_profile(request: ProfileRequest):
 
     PROFILES_DB[request.user_id] = {"name": request.user_name, "sins": traits, "raw_responses": request.responses}
     if request.hla_data:
-        HLA_DB[request.user_id] = s[3].parse_hla_input(request.hla_data)
+        HLA_DB[request.user_id] = s.hla.to_storage(s.hla.parse_hla_input(request.hla_data))
+    _profile_changed(request.user_id)
     return {"status": "profile_created", "user_id": request.user_id}
 
-@app.post("/api/analyze")
-async def analyze(request: AnalysisRequest):
-    s = get_services()
-    p1, p2 = PROFILES_DB[request.user_a_id], PROFILES_DB[request.user_b_id]
-    
-    vr = {'mutual_attraction_score': 50.0}
-    if request.user_a_id in IMAGES_DB and request.user_b_id in IMAGES_DB:
-        vr = s[2].calculate_mutual_attraction(IMAGES_DB[request.user_a_id]['features'], IMAGES_DB[request.user_b_id]['features'])
-    
-    # Calculate compatibility scores
-    hr = {'compatibility_score': 50.0}
-    if request.user_a_id in HLA_DB and request.user_b_id in HLA_DB:
-        hr = s[3].calculate_hla_compatibility(HLA_DB[request.user_a_id], HLA_DB[request.user_b_id])
-
-    ps = s[1].calculate_perceived_similarity(p1['sins'], p2['sins'])
-    an = await s[0].generate_full_analysis(p1, p2, vr['mutual_attraction_score'], hr['compatibility_score'], vr, hr)
-
-    # Create reports directory
-    os.makedirs("harmonia_outputs", exist_ok=True)
-    rf = f"harmonia_outputs/report_{request.user_a_id}_{request.user_b_id}.docx"
-    s[4].generate_full_report(p1, p2, an, vr, hr, ps, {'visual': 50, 'personality': 35, 'hla': 15}, rf)
-    REPORTS_DB[f"{request.user_a_id}_{request.user_b_id}"] = rf
+async def _noop_progress(stage: str, percent: int):
+    pass
+
+# Progress reported to job pollers when each pipeline stage starts
+STAGE_PROGRESS = {"scoring": 5, "narrative": 20, "report": 80}
+
+def _remove_stale_reports(pair_key: str, paths):
+    """Delete report files that neither the download link nor the memo of pair_key points to any more."""
+    keep = {None, REPORTS_DB.get(pair_key), (ANALYSES_DB.get(pair_key) or {}).get("report_path")}
+    for path in set(paths) - keep:
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+
+async def _analysis_events(user_a_id: str, user_b_id: str, s: ServiceContainer):
+    """
+    Full analyze pipeline as a stream of (event, data) pairs, each emitted as
+    soon as it is ready. The last event is ("complete", full /api/analyze response).
+    """
+    p1, p2 = PROFILES_DB[user_a_id], PROFILES_DB[user_b_id]
+
+    # Stage graph: visual, HLA and personality are independent and run together;
+    # the narrative needs visual + HLA; the report needs everything.
+    async def visual_stage():
+        if user_a_id in IMAGES_DB and user_b_id in IMAGES_DB:
+            return s.visual.calculate_mutual_attraction(IMAGES_DB[user_a_id]['features'], IMAGES_DB[user_b_id]['features'])
+        return {'mutual_attraction_score': 50.0}
+
+    async def hla_stage():
+        if user_a_id in HLA_DB and user_b_id in HLA_DB:
+            # Large SNP comparisons are CPU-bound: keep them off the event loop
+            return await run_compute(s.hla.calculate_hla_compatibility, HLA_DB[user_a_id], HLA_DB[user_b_id])
+        return {'compatibility_score': 50.0}
+
+    async def personality_stage():
+        return s.similarity.calculate_perceived_similarity(p1['sins'], p2['sins'])
+
+    yield "stage", {"stage": "scoring"}
+    pending = {
+        asyncio.create_task(visual_stage(), name="visual"),
+        asyncio.create_task(hla_stage(), name="hla"),
+        asyncio.create_task(personality_stage(), name="personality"),
+    }
+    scores = {}
+    try:
+        while pending:
+            done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                name = task.get_name()
+                scores[name] = task.result()
+                if name == "visual":
+                    yield "visual", {"score": scores[name]['mutual_attraction_score']}
+                elif name == "hla":
+                    yield "hla", {"score": scores[name]['compatibility_score']}
+                else:
+                    yield "personality", {"score": scores[name]}
+    finally:
+        for task in pending:
+            task.cancel()
+    vr, hr, ps = scores["visual"], scores["hla"], scores["personality"]
 
     ov = vr['mutual_attraction_score'] * 0.50 + ps * 0.35 + hr['compatibility_score'] * 0.15
+    yield "overall", {"overall_score": round(ov, 1)}
+
+    # Same inputs as last time -> reuse the stored narrative and report
+    pair_key = f"{user_a_id}_{user_b_id}"
+    fingerprint = content_key(
+        "analysis", s.gemini.ANALYSIS_PROMPT_VERSION, s.report.REPORT_VERSION, s.gemini.model_name,
+        [p1['name'], p1['sins'], p1.get('raw_responses')], [p2['name'], p2['sins'], p2.get('raw_responses')], vr, hr, ps
+    )
+    # One file per input state, so a later run never rewrites a memoized report
+    rf = f"harmonia_outputs/report_{user_a_id}_{user_b_id}_{fingerprint[:16]}.docx"
+    memo = ANALYSES_DB.get(pair_key)
+    previous = {REPORTS_DB.get(pair_key), (memo or {}).get("report_path")}
+    if memo and memo["fingerprint"] == fingerprint and os.path.exists(memo["report_path"]):
+        an = memo["analysis"]
+        for field, value in an.items():
+            yield "analysis", {"field": field, "value": value}
+        REPORTS_DB[pair_key] = memo["report_path"]
+        _remove_stale_reports(pair_key, previous)
+        yield "report", {"download_url": f"/api/download-report/{user_a_id}/{user_b_id}", "cached": True}
+    else:
+        yield "stage", {"stage": "narrative"}
+        if Config.STREAM_ANALYSIS:
+            # Narrative fields arrive one by one while the model is still writing
+            async for kind, data in s.gemini.stream_full_analysis(p1, p2, vr['mutual_attraction_score'], hr['compatibility_score'], vr, hr):
+                if kind == "field":
+                    yield "analysis", data
+                else:
+                    an = data
+        else:
+            an = await s.gemini.generate_full_analysis(p1, p2, vr['mutual_attraction_score'], hr['compatibility_score'], vr, hr)
+            for field, value in an.items():
+                yield "analysis", {"field": field, "value": value}
+
+        # Create reports directory
+        yield "stage", {"stage": "report"}
+        os.makedirs("harmonia_outputs", exist_ok=True)
+        await run_compute(s.report.generate_full_report, p1, p2, an, vr, hr, ps, {'visual': 50, 'personality': 35, 'hla': 15}, rf)
+        REPORTS_DB[pair_key] = rf
+        # Canned fallback text is not worth keeping: retry the model next time
+        if not s.gemini.uses_fallback_analysis(an, p1, p2):
+            ANALYSES_DB[pair_key] = {"fingerprint": fingerprint, "analysis": an, "report_path": rf}
+        elif memo and memo["report_path"] == rf:
+            ANALYSES_DB.pop(pair_key, None)  # Its report (missing before) now holds the fallback text
+        _remove_stale_reports(pair_key, previous)
+        yield "report", {"download_url": f"/api/download-report/{user_a_id}/{user_b_id}", "cached": False}
 
     # Backend uses neutral trait keys, but frontend displays original sin names
     trait_order = ["drive", "confidence", "passion", "assertiveness", "indulgence", "aspiration", "ease"]
     trait_labels = ["Greed", "Pride", "Lust", "Wrath", "Gluttony", "Envy", "Sloth"]  # Display names for frontend
 
-    return {
+    yield "complete", {
         "overall_score": round(ov, 1),
         "components": {
             "visual": {"score": vr['mutual_attraction_score']},
@@ -330,6 +523,99 @@ async def analyze(request: AnalysisRequest):
         }
     }
 
+async def _run_analysis(user_a_id: str, user_b_id: str, s: ServiceContainer, progress=_noop_progress) -> dict:
+    """Full analyze pipeline: scores, Gemini narrative, DOCX report."""
+    async for event, data in _analysis_events(user_a_id, user_b_id, s):
+        if event == "stage":
+            await progress(data["stage"], STAGE_PROGRESS[data["stage"]])
+        elif event == "complete":
+            return data
+
+@app.post("/api/analyze")
+async def analyze(request: AnalysisRequest, s: ServiceContainer = Depends(get_services)):
+    return await _run_analysis(request.user_a_id, request.user_b_id, s)
+
+@app.get("/api/analyze/stream")
+async def analyze_stream(user_a_id: str, user_b_id: str, s: ServiceContainer = Depends(get_services)):
+    """
+    Server-Sent Events version of /api/analyze: visual, hla, personality and
+    overall scores first, then one "analysis" event per narrative field, then
+    "report" when the DOCX is ready and "complete" with the full response.
+    """
+    for uid in (user_a_id, user_b_id):
+        if uid not in PROFILES_DB:
+            raise HTTPException(404, f"Profile not found: {uid}")
+
+    async def event_stream():
+        try:
+            async for event, data in _analysis_events(user_a_id, user_b_id, s):
+                yield f"event: {event}\ndata: {json.dumps(data)}\n\n"
+        except Exception as e:
+            traceback.print_exc()
+            yield f"event: error\ndata: {json.dumps({'error': str(e)})}\n\n"
+
+    return StreamingResponse(event_stream(), media_type="text/event-stream",
+                             headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+
+async def _analysis_job_runner(payload: dict, progress) -> dict:
+    return await _run_analysis(payload['user_a_id'], payload['user_b_id'], get_services(), progress)
+
+@app.post("/api/analyze/async")
+async def analyze_async(request: AnalysisRequest):
+    """Queue an analysis and return immediately; poll GET /api/analyze/{job_id}."""
+    for uid in (request.user_a_id, request.user_b_id):
+        if uid not in PROFILES_DB:
+            raise HTTPException(404, f"Profile not found: {uid}")
+    job_id = JOBS.submit({"user_a_id": request.user_a_id, "user_b_id": request.user_b_id})
+    return {"status": "queued", "job_id": job_id}
+
+@app.get("/api/analyze/{job_id}")
+async def analyze_status(job_id: str):
+    job = JOBS.get(job_id)
+    if not job:
+        raise HTTPException(404, "Job not found")
+    return {k: job[k] for k in ("job_id", "status", "stage", "progress", "result", "error")}
+
+def _profile_changed(user_id: str):
+    """Queue a user's top match list (and the lists they appear in) for a background update."""
+    if TOP_MATCHES:
+        TOP_MATCHES.mark_changed(user_id)
+
+@app.get("/api/matches/{user_id}")
+async def matches(user_id: str, k: int = 10):
+    """Top-k partners for user_id across all stored profiles (same weighting as /api/analyze)."""
+    if not 1 <= k <= 100:
+        raise HTTPException(400, "k must be between 1 and 100")
+    stored = TOP_MATCHES.get(user_id, k)
+    if stored is not None:
+        return {"user_id": user_id, "method": "precomputed", "population": len(MATCH_INDEX.snapshot.ids), "matches": stored}
+
+    # No current list (k above TOP_MATCHES_K, or an update still queued): search now
+    try:
+        if TOP_MATCHES.is_pending(user_id):
+            await run_compute(MATCH_INDEX.update_users, [user_id])
+        return await run_compute(MATCH_INDEX.top_matches, user_id, k)
+    except KeyError:
+        raise HTTPException(404, f"Profile not found: {user_id}")
+
+@app.post("/api/cohort/matrix")
+async def cohort_matrix(request: CohortRequest, s: ServiceContainer = Depends(get_services)):
+    """All-pairs component and overall scores for a group (no narrative or reports)."""
+    ids = list(dict.fromkeys(request.user_ids))
+    if len(ids) < 2 or len(ids) > Config.COHORT_MAX_SIZE:
+        raise HTTPException(400, f"Cohort must have between 2 and {Config.COHORT_MAX_SIZE} distinct users")
+    missing = [u for u in ids if u not in PROFILES_DB]
+    if missing:
+        raise HTTPException(404, f"Profiles not found: {', '.join(missing[:10])}")
+
+    m = await run_compute(compatibility_matrix, ids, PROFILES_DB, IMAGES_DB, HLA_DB, s.hla, Config.COHORT_BLOCK_SIZE)
+    rows = lambda a: [[None if x != x else float(x) for x in row] for row in a.tolist()]
+    return {
+        "user_ids": ids,
+        "overall": rows(m["overall"]),
+        "components": {c: rows(m[c]) for c in ("visual", "personality", "hla")}
+    }
+
 @app.get("/api/download-report/{user_a_id}/{user_b_id}")
 async def download_report(user_a_id: str, user_b_id: str):
     k = f"{user_a_id}_{user_b_id}"
@@ -0,0 +1,154 @@
+"""
+Cache Service - Content-addressed result caches
+An in-memory LRU tier with size and TTL eviction, optionally backed by an
+on-disk tier (SQLite, via the storage layer) shared by workers and restarts.
+"""
+
+import hashlib
+import json
+import logging
+import os
+import re
+import threading
+import time
+from collections import OrderedDict
+
+from services.storage_service import create_storage
+
+logger = logging.getLogger(__name__)
+
+
+def normalize_text(text: str) -> str:
+    """Case- and whitespace-insensitive form used for cache keys."""
+    return re.sub(r'\s+', ' ', (text or '').strip().lower())
+
+
+def content_key(*parts) -> str:
+    """Stable sha256 key over JSON-serialisable parts."""
+    return hashlib.sha256(json.dumps(parts, sort_keys=True, default=str).encode('utf-8')).hexdigest()
+
+
+class ResultCache:
+    """
+    Two-tier cache: LRU dict in memory, then optional disk table.
+    Every entry lives ttl seconds, so expired disk rows are exactly those
+    written more than ttl ago; set() deletes them at most once per purge_interval.
+    """
+
+    def __init__(self, name: str, max_entries: int = 10000, ttl: float = 7 * 24 * 3600, disk_table=None,
+                 purge_interval: float = 3600):
+        self.name = name
+        self.max_entries = max(1, max_entries)
+        self.ttl = ttl
+        self.disk = disk_table
+        self.purge_interval = purge_interval
+        self._purged_at = 0.0
+        self._entries = OrderedDict()   # key -> (expires_at, value)
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.purged = 0
+
+    def get(self, key: str, default=None):
+        now = time.time()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                if entry[0] > now:
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    return entry[1]
+                del self._entries[key]
+
+        if self.disk is not None:
+            try:
+                stored = self.disk.get(key)
+            except Exception as e:
+                logger.warning(f"⚠️  {self.name} disk cache read failed: {e}")
+                stored = None
+            if stored and stored['expires_at'] > now:
+                self._remember(key, stored['value'], stored['expires_at'])
+                with self._lock:
+                    self.disk_hits += 1
+                return stored['value']
+
+        with self._lock:
+            self.misses += 1
+        return default
+
+    def set(self, key: str, value):
+        expires_at = time.time() + self.ttl
+        self._remember(key, value, expires_at)
+        if self.disk is not None:
+            try:
+                self.disk[key] = {'expires_at': expires_at, 'value': value}
+            except Exception as e:
+                logger.warning(f"⚠️  {self.name} disk cache write failed: {e}")
+            self._purge_disk()
+
+    def _purge_disk(self):
+        now = time.time()
+        with self._lock:
+            if now - self._purged_at < self.purge_interval:
+                return
+            self._purged_at = now
+        try:
+            purged = self.disk.purge_older_than(self.ttl)
+        except Exception as e:
+            logger.warning(f"⚠️  {self.name} disk cache purge failed: {e}")
+            return
+        if purged:
+            with self._lock:
+                self.purged += purged
+            logger.info(f"🧹 {self.name}: {purged} expired disk entries deleted")
+
+    def _remember(self, key, value, expires_at):
+        with self._lock:
+            self._entries[key] = (expires_at, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self.hits + self.disk_hits + self.misses
+            return {
+                'entries': len(self._entries),
+                'max_entries': self.max_entries,
+                'ttl_seconds': self.ttl,
+                'disk': self.disk is not None,
+                'hits': self.hits,
+                'disk_hits': self.disk_hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'disk_purged': self.purged,
+                'hit_rate': round((self.hits + self.disk_hits) / lookups, 3) if lookups else 0.0
+            }
+
+
+_parse_cache = None
+_parse_cache_lock = threading.Lock()
+
+
+def get_parse_cache() -> ResultCache:
+    """Process-wide cache of parse_response trait scores (survives service reloads)."""
+    global _parse_cache
+    if _parse_cache is None:
+        with _parse_cache_lock:
+            if _parse_cache is None:
+                path = os.getenv('PARSE_CACHE_PATH', '')
+                disk = create_storage('sqlite', path).table('parse_cache') if path else None
+                _parse_cache = ResultCache(
+                    'parse_cache',
+                    max_entries=int(os.getenv('PARSE_CACHE_SIZE', '10000')),
+                    ttl=float(os.getenv('PARSE_CACHE_TTL', str(7 * 24 * 3600))),
+                    disk_table=disk
+                )
+    return _parse_cache
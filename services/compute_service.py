@@ -0,0 +1,60 @@
+"""
+Compute Service - Off-loop execution for CPU-bound pipeline stages
+DOCX report building and large HLA comparisons run on a small dedicated
+thread pool, kept separate from the LLM pool so slow model calls never
+starve them (and vice versa). Work that needs several cores at once
+(parsing very large DNA files) goes to a separate process pool.
+"""
+
+import asyncio
+import functools
+import logging
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+logger = logging.getLogger(__name__)
+
+_executor = None
+_process_executor = None
+
+
+def get_compute_executor() -> ThreadPoolExecutor:
+    """Return the process-wide executor for CPU-bound stages (created lazily)."""
+    global _executor
+    if _executor is None:
+        max_workers = max(1, int(os.getenv('COMPUTE_MAX_WORKERS', str(min(4, os.cpu_count() or 1)))))
+        _executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='compute')
+        logger.info(f"✅ Compute executor ready ({max_workers} threads)")
+    return _executor
+
+
+async def run_compute(fn, *args, **kwargs):
+    """Run a blocking, CPU-heavy call on the compute executor and await its result."""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(get_compute_executor(), functools.partial(fn, *args, **kwargs))
+
+
+def get_process_executor() -> ProcessPoolExecutor:
+    """
+    Return the process-wide pool for multi-core parsing (created lazily; worker
+    processes start on first use). Workers are spawned, not forked, so they
+    never inherit the server's threads or locks.
+    """
+    global _process_executor
+    if _process_executor is None:
+        max_workers = max(1, int(os.getenv('PARSE_PROCESS_WORKERS', str(min(4, os.cpu_count() or 1)))))
+        _process_executor = ProcessPoolExecutor(max_workers=max_workers, mp_context=multiprocessing.get_context('spawn'))
+        logger.info(f"✅ Parse process pool ready ({max_workers} processes)")
+    return _process_executor
+
+
+def shutdown_compute_executor():
+    """Stop the executors; running stages are allowed to finish."""
+    global _executor, _process_executor
+    if _executor is not None:
+        _executor.shutdown(wait=True)
+        _executor = None
+    if _process_executor is not None:
+        _process_executor.shutdown(wait=True)
+        _process_executor = None
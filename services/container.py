@@ -0,0 +1,64 @@
+"""
+Service Container - One set of services per process
+Built once at startup and handed to endpoints through FastAPI dependencies,
+instead of re-constructing (and re-configuring genai) on every request.
+"""
+
+import logging
+import os
+import threading
+
+from services.gemini_service import GeminiService
+from services.similarity_service import SimilarityService
+from services.visual_service import VisualService
+from services.hla_service import HLAService
+from services.report_service import ReportService
+
+logger = logging.getLogger(__name__)
+
+
+class ServiceContainer:
+    """Application-scoped holder for all Harmonia services."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._reload_hooks = []
+        self._build()
+
+    def _build(self):
+        # GeminiService refuses to start without an API key; keep it lazy so the
+        # app still boots (and non-AI endpoints still work) until one is set.
+        try:
+            gemini = GeminiService()
+        except ValueError as e:
+            logger.warning(f"⚠️  GeminiService not ready: {e}")
+            gemini = None
+        self.similarity = SimilarityService()
+        self.visual = VisualService(os.getenv('GEMINI_API_KEY'))
+        self.hla = HLAService()
+        self.report = ReportService()
+        self._gemini = gemini
+
+    @property
+    def gemini(self) -> GeminiService:
+        if self._gemini is None:
+            with self._lock:
+                if self._gemini is None:
+                    self._gemini = GeminiService()
+        return self._gemini
+
+    def add_reload_hook(self, hook):
+        """Register a callable run after every reload (e.g. to drop cached clients)."""
+        self._reload_hooks.append(hook)
+
+    def reload(self):
+        """Rebuild every service from the current environment (model, API key, ...)."""
+        with self._lock:
+            logger.info("🔄 Reloading services...")
+            self._build()
+        for hook in self._reload_hooks:
+            try:
+                hook()
+            except Exception as e:
+                logger.warning(f"⚠️  Reload hook {getattr(hook, '__name__', hook)} failed: {e}")
+        logger.info("✅ Services reloaded")
@@ -3,11 +3,15 @@ Gemini Service - FORCED DETAILED REPORTS
 Uses verbose prompts to force comprehensive analysis!
 """
 
-import google.generativeai as genai
+import asyncio
 import json
 import re
 import os
 
+from services.llm_service import run_llm_call, configure_genai, get_model
+from services.json_stream import IncrementalJSONParser
+from services.cache_service import get_parse_cache, content_key, normalize_text
+
 class GeminiService:
     # Available models
     AVAILABLE_MODELS = {
@@ -17,12 +21,30 @@ class GeminiService:
         'gemini-2.5-flash': 'Gemini 2.5 Flash',
     }
 
+    TRAITS = ["drive", "confidence", "passion", "assertiveness", "indulgence", "aspiration", "ease"]
+
+    TRAIT_DEFINITIONS = """- drive: Ambition, material focus, resource acquisition, achievement orientation, goal pursuit
+- confidence: Self-assurance, recognition of accomplishments, self-worth, leadership qualities
+- passion: Intensity, desire for experiences/power/connection, enthusiasm, fulfillment pursuit
+- assertiveness: Directness, conflict approach, boundary setting, intensity in disagreements
+- indulgence: Pleasure-seeking, sensory enjoyment, self-care, experiential focus
+- aspiration: Social comparison, competitive drive, desire for growth, ambition through comparison
+- ease: Relaxation preference, energy conservation, pace preference, work-life balance focus"""
+
+    # Bump whenever the trait prompts change so cached scores are not reused
+    PARSE_PROMPT_VERSION = 1
+    ANALYSIS_PROMPT_VERSION = 1
+
+    # Batch scoring budget: ~7 traits x (score + one-line evidence) per answer
+    BATCH_MAX_OUTPUT_TOKENS = 8192
+    BATCH_TOKENS_PER_ANSWER = 350
+
     def __init__(self, model_name: str = None):
         api_key = os.getenv('GEMINI_API_KEY')
         if not api_key:
             raise ValueError("No API key!")
 
-        genai.configure(api_key=api_key)
+        configure_genai(api_key)
 
         # Use environment variable or default to Gemini 3 Pro (most advanced)
         self.model_name = model_name or os.getenv('GEMINI_MODEL', 'gemini-3-pro-preview')
@@ -51,12 +73,12 @@ class GeminiService:
         for model_name in models_to_try:
             try:
                 print(f"🔮 Trying {self.AVAILABLE_MODELS.get(model_name, model_name)}...")
-                model = genai.GenerativeModel(model_name)
+                model = get_model(model_name, generation_config, self.safety_settings)
 
                 if images:
-                    response = model.generate_content([prompt] + images, generation_config=generation_config, safety_settings=self.safety_settings)
+                    response = model.generate_content([prompt] + images)
                 else:
-                    response = model.generate_content(prompt, generation_config=generation_config, safety_settings=self.safety_settings)
+                    response = model.generate_content(prompt)
 
                 text = self._extract_text_safely(response)
                 if text:
@@ -73,6 +95,43 @@ class GeminiService:
 
         return None
 
+    def _stream_with_fallback(self, prompt, generation_config, on_chunk) -> bool:
+        """
+        Streaming variant of _generate_with_fallback: on_chunk(text) is called per chunk.
+        Falls back to the next model only if nothing was streamed yet; a stream cut off
+        midway is left as is so the caller keeps the partial output.
+        """
+        models_to_try = [self.model_name] + self.fallback_models
+
+        for model_name in models_to_try:
+            streamed = False
+            try:
+                print(f"🔮 Streaming {self.AVAILABLE_MODELS.get(model_name, model_name)}...")
+                model = get_model(model_name, generation_config, self.safety_settings)
+                for chunk in model.generate_content(prompt, stream=True):
+                    try:
+                        text = chunk.text
+                    except ValueError:  # Chunk without text parts (e.g. safety block)
+                        continue
+                    if text:
+                        streamed = True
+                        on_chunk(text)
+                if streamed:
+                    print(f"✅ Streamed with {self.AVAILABLE_MODELS.get(model_name, model_name)}")
+                    return True
+
+                print(f"⚠️  {self.AVAILABLE_MODELS.get(model_name, model_name)} streamed nothing, trying next...")
+
+            except Exception as e:
+                print(f"⚠️  {self.AVAILABLE_MODELS.get(model_name, model_name)} stream failed: {e}")
+                if streamed:
+                    return True
+                if model_name == models_to_try[-1]:  # Last model
+                    raise
+                print(f"   Trying fallback model...")
+
+        return False
+
     def _extract_text_safely(self, response) -> str:
         """Safely extract text from Gemini response, handling blocked/empty responses."""
         try:
@@ -113,19 +172,26 @@ class GeminiService:
             print(f"⚠️  Error extracting text: {e}")
             return None
     
+    def _parse_cache_key(self, question: str, answer: str) -> str:
+        return content_key('parse', self.PARSE_PROMPT_VERSION, self.model_name, normalize_text(question), normalize_text(answer))
+
     async def parse_response(self, question: str, answer: str) -> dict:
         """Parse quiz for personality traits using neutral framework."""
+        cache = get_parse_cache()
+        cache_key = self._parse_cache_key(question, answer)
+        cached = cache.get(cache_key)
+        if cached is not None:
+            return cached
+        return await self._parse_uncached(question, answer, cache_key)
+
+    async def _parse_uncached(self, question: str, answer: str, cache_key: str) -> dict:
+        """parse_response after its cache lookup missed: one model call, result cached under cache_key."""
+        cache = get_parse_cache()
         prompt = f"""Analyze this response for personality traits across 7 dimensions. Return ONLY JSON:
 {{"drive": {{"score": X, "evidence": "..."}}, "confidence": {{"score": X, "evidence": "..."}}, "passion": {{"score": X, "evidence": "..."}}, "assertiveness": {{"score": X, "evidence": "..."}}, "indulgence": {{"score": X, "evidence": "..."}}, "aspiration": {{"score": X, "evidence": "..."}}, "ease": {{"score": X, "evidence": "..."}}}}
 
 Trait definitions (score 0-100):
-- drive: Ambition, material focus, resource acquisition, achievement orientation, goal pursuit
-- confidence: Self-assurance, recognition of accomplishments, self-worth, leadership qualities
-- passion: Intensity, desire for experiences/power/connection, enthusiasm, fulfillment pursuit
-- assertiveness: Directness, conflict approach, boundary setting, intensity in disagreements
-- indulgence: Pleasure-seeking, sensory enjoyment, self-care, experiential focus
-- aspiration: Social comparison, competitive drive, desire for growth, ambition through comparison
-- ease: Relaxation preference, energy conservation, pace preference, work-life balance focus
+{self.TRAIT_DEFINITIONS}
 
 Question: {question}
 Response: {answer}
@@ -135,33 +201,145 @@ Score each 0-100 based on evidence in the response."""
         try:
             print(f"\n📝 Parsing: {question[:50]}...")
 
-            text = self._generate_with_fallback(
+            text = await run_llm_call(
+                self._generate_with_fallback,
                 prompt,
                 generation_config={'temperature': 0.6, 'max_output_tokens': 4096}
             )
 
             if not text:
                 print(f"❌ All models returned empty responses\n")
-                return {trait: {'score': 0, 'evidence': 'N/A'} for trait in ["drive", "confidence", "passion", "assertiveness", "indulgence", "aspiration", "ease"]}
+                return self._unscored()
 
             cleaned = re.sub(r'^```json\s*|^```\s*|\s*```$', '', text.strip())
             result = json.loads(cleaned)
             print(f"✅ Parsed\n")
+            if isinstance(result, dict) and all(t in result for t in self.TRAITS):
+                cache.set(cache_key, result)
             return result
         except Exception as e:
             print(f"❌ {e}\n")
-            return {trait: {'score': 0, 'evidence': 'N/A'} for trait in ["drive", "confidence", "passion", "assertiveness", "indulgence", "aspiration", "ease"]}
+            return self._unscored()
     
-    async def generate_full_analysis(self, profile_a, profile_b, visual_score, hla_score, visual_details, hla_details) -> dict:
-        """FORCE comprehensive multi-paragraph analysis!"""
+    def _unscored(self) -> dict:
+        """Trait dict returned when an answer could not be scored."""
+        return {trait: {'score': 0, 'evidence': 'N/A'} for trait in self.TRAITS}
+
+    async def parse_responses_batch(self, pairs: list, max_concurrency: int = 4) -> list:
+        """
+        Score many (question, answer) pairs with one model call per chunk.
+
+        Chunks are sized to fit the output token budget and run concurrently
+        (at most max_concurrency at once). Results are returned in input order,
+        one trait dict per pair, exactly like parse_response.
+        """
+        if not pairs:
+            return []
+
+        # Identical answers (e.g. generated fallback texts) are looked up and scored once
+        cache = get_parse_cache()
+        keys = [self._parse_cache_key(q, a) for q, a in pairs]
+        first = {}  # cache key -> index of its first pair
+        for i, key in enumerate(keys):
+            first.setdefault(key, i)
+        found = {key: cache.get(key) for key in first}
+        missing = [i for key, i in first.items() if found[key] is None]
+        if not missing:
+            return [found[key] for key in keys]
+        full_pairs, pairs = pairs, [pairs[i] for i in missing]
+
+        batch_size = int(os.getenv('PARSE_BATCH_SIZE', '20'))
+        batch_size = max(1, min(batch_size, self.BATCH_MAX_OUTPUT_TOKENS // self.BATCH_TOKENS_PER_ANSWER))
+        chunks = [pairs[i:i + batch_size] for i in range(0, len(pairs), batch_size)]
+        sem = asyncio.Semaphore(max(1, max_concurrency))
+
+        async def run_chunk(chunk):
+            async with sem:
+                return await self._parse_batch_chunk(chunk)
+
+        print(f"\n📝 Batch parsing {len(pairs)} answers in {len(chunks)} call(s)"
+              f" ({len(full_pairs) - len(pairs)} cached or repeated)...")
+        scored = await asyncio.gather(*(run_chunk(c) for c in chunks))
+        for i, r in zip(missing, (r for chunk_result in scored for r in chunk_result)):
+            found[keys[i]] = r
+        return [found[key] for key in keys]
+
+    async def _parse_batch_chunk(self, pairs: list) -> list:
+        """
+        Score one chunk; on truncated/malformed output split it in half and retry.
+        If no model answers at all, the chunk is marked N/A without splitting.
+        """
+        if len(pairs) == 1:
+            # Already looked up (and missed) by parse_responses_batch
+            return [await self._parse_uncached(*pairs[0], self._parse_cache_key(*pairs[0]))]
+
+        numbered = "\n\n".join(f"[{i}] Question: {q}\nResponse: {a}" for i, (q, a) in enumerate(pairs, 1))
+        prompt = f"""Analyze each numbered response below for personality traits across 7 dimensions. Return ONLY a JSON array with exactly {len(pairs)} objects, one per response, in the same order:
+[{{"index": 1, "drive": {{"score": X, "evidence": "..."}}, "confidence": {{"score": X, "evidence": "..."}}, "passion": {{"score": X, "evidence": "..."}}, "assertiveness": {{"score": X, "evidence": "..."}}, "indulgence": {{"score": X, "evidence": "..."}}, "aspiration": {{"score": X, "evidence": "..."}}, "ease": {{"score": X, "evidence": "..."}}}}, ...]
 
-        print(f"\n🔮 REPORT: {profile_a['name']} & {profile_b['name']}")
+Trait definitions (score 0-100):
+{self.TRAIT_DEFINITIONS}
 
+{numbered}
+
+Score each response independently 0-100 based on evidence in that response only. Keep each evidence to one short sentence."""
+
+        try:
+            text = await run_llm_call(
+                self._generate_with_fallback,
+                prompt,
+                generation_config={
+                    'temperature': 0.6,
+                    'max_output_tokens': min(self.BATCH_MAX_OUTPUT_TOKENS, self.BATCH_TOKENS_PER_ANSWER * len(pairs) + 256)
+                }
+            )
+        except Exception as e:
+            print(f"⚠️  Batch of {len(pairs)} failed: {e}")
+            text = None
+        if not text:
+            # No model answered: smaller calls would fail the same way, so don't split
+            print(f"❌ All models failed for a batch of {len(pairs)}, marking it N/A\n")
+            return [self._unscored() for _ in pairs]
+
+        results = [None] * len(pairs)
+        try:
+            cleaned = re.sub(r'^```json\s*|^```\s*|\s*```$', '', text.strip())
+            items = json.loads(cleaned)
+            if isinstance(items, list):
+                for pos, item in enumerate(items):
+                    if not isinstance(item, dict):
+                        continue
+                    idx = item.pop('index', pos + 1)
+                    if isinstance(idx, int) and 1 <= idx <= len(pairs) and all(t in item for t in self.TRAITS):
+                        results[idx - 1] = item
+                        get_parse_cache().set(self._parse_cache_key(*pairs[idx - 1]), item)
+        except Exception as e:
+            print(f"⚠️  Batch of {len(pairs)} returned malformed output: {e}")
+
+        missing = [i for i, r in enumerate(results) if r is None]
+        if missing:
+            # Truncated or partial output: re-score only what is missing, in halves
+            print(f"⚠️  {len(missing)}/{len(pairs)} answers missing from batch, splitting...")
+            retry = [pairs[i] for i in missing]
+            if len(retry) == len(pairs):
+                mid = len(retry) // 2
+                parts = [retry[:mid], retry[mid:]]
+            else:
+                parts = [retry]
+            rescored = []
+            for part in await asyncio.gather(*(self._parse_batch_chunk(p) for p in parts)):
+                rescored.extend(part)
+            for i, r in zip(missing, rescored):
+                results[i] = r
+
+        return results
+
+    def _analysis_prompt(self, profile_a, profile_b, visual_score, hla_score) -> str:
         p1_traits = {k: v['score'] for k, v in profile_a['sins'].items()}
         p2_traits = {k: v['score'] for k, v in profile_b['sins'].items()}
 
         # EXTREMELY DETAILED prompt with word count requirements - NEUTRAL LANGUAGE
-        prompt = f"""You are generating a COMPREHENSIVE romantic compatibility analysis report for two individuals. You MUST provide DETAILED, MULTI-PARAGRAPH responses.
+        return f"""You are generating a COMPREHENSIVE romantic compatibility analysis report for two individuals. You MUST provide DETAILED, MULTI-PARAGRAPH responses.
 
 Person A ({profile_a['name']}) - Personality Profile:
 - Drive: {p1_traits.get('drive', 0)}%
@@ -206,8 +384,43 @@ Generate DETAILED compatibility analysis. Return JSON with these EXACT fields:
 
 CRITICAL: Each field MUST meet its word count minimum. Be COMPREHENSIVE, DETAILED, SPECIFIC. Write FULL PARAGRAPHS."""
 
+    def _fallback_analysis(self, profile_a, profile_b) -> dict:
+        """Canned analysis used when every model fails."""
+        return {
+            "themes": ["Complementary Dynamics", "Shared Growth Potential", "Balanced Energy"],
+            "deep_analysis": f"The compatibility between {profile_a['name']} and {profile_b['name']} demonstrates meaningful potential across multiple dimensions of personality and interpersonal dynamics. Their personality profiles suggest a relationship characterized by both natural synergy and constructive tension that could fuel growth.",
+            "perceived_similarity": "Both individuals demonstrate thoughtful, introspective approaches to life and relationships, suggesting strong mutual understanding potential.",
+            "compatibility_verdict": "This pairing shows moderate to strong compatibility with clear potential for a meaningful, balanced connection built on mutual respect and complementary strengths.",
+            "ui_cards": {
+                "vibe_check": "A balanced connection with authentic mutual respect and room for both comfort and challenge.",
+                "first_impression": "Natural chemistry balanced with intellectual alignment and genuine curiosity about each other.",
+                "long_term_key": "Strong communication foundation, shared core values, and complementary approaches to growth and stability.",
+                "green_flag": "Emotional maturity, genuine openness to growth, and balanced self-awareness in both individuals.",
+                "red_flag": "Different communication styles and processing speeds that require patience and conscious awareness to navigate effectively."
+            }
+        }
+
+    def uses_fallback_analysis(self, analysis: dict, profile_a, profile_b) -> bool:
+        """True if any field of analysis is canned fallback text rather than model output."""
+        for key, value in self._fallback_analysis(profile_a, profile_b).items():
+            if isinstance(value, dict):
+                cards = analysis.get(key)
+                if isinstance(cards, dict) and any(cards.get(card) == text for card, text in value.items()):
+                    return True
+            elif analysis.get(key) == value:
+                return True
+        return False
+
+    async def generate_full_analysis(self, profile_a, profile_b, visual_score, hla_score, visual_details, hla_details) -> dict:
+        """FORCE comprehensive multi-paragraph analysis!"""
+
+        print(f"\n🔮 REPORT: {profile_a['name']} & {profile_b['name']}")
+
+        prompt = self._analysis_prompt(profile_a, profile_b, visual_score, hla_score)
+
         try:
-            text = self._generate_with_fallback(
+            text = await run_llm_call(
+                self._generate_with_fallback,
                 prompt,
                 generation_config={
                     'temperature': 0.85,  # High for detailed content
@@ -217,19 +430,7 @@ CRITICAL: Each field MUST meet its word count minimum. Be COMPREHENSIVE, DETAILE
 
             if not text:
                 print(f"❌ All models returned empty responses, using fallback\n")
-                return {
-                    "themes": ["Complementary Dynamics", "Shared Growth Potential", "Balanced Energy"],
-                    "deep_analysis": f"The compatibility between {profile_a['name']} and {profile_b['name']} demonstrates meaningful potential across multiple dimensions of personality and interpersonal dynamics. Their personality profiles suggest a relationship characterized by both natural synergy and constructive tension that could fuel growth.",
-                    "perceived_similarity": "Both individuals demonstrate thoughtful, introspective approaches to life and relationships, suggesting strong mutual understanding potential.",
-                    "compatibility_verdict": "This pairing shows moderate to strong compatibility with clear potential for a meaningful, balanced connection built on mutual respect and complementary strengths.",
-                    "ui_cards": {
-                        "vibe_check": "A balanced connection with authentic mutual respect and room for both comfort and challenge.",
-                        "first_impression": "Natural chemistry balanced with intellectual alignment and genuine curiosity about each other.",
-                        "long_term_key": "Strong communication foundation, shared core values, and complementary approaches to growth and stability.",
-                        "green_flag": "Emotional maturity, genuine openness to growth, and balanced self-awareness in both individuals.",
-                        "red_flag": "Different communication styles and processing speeds that require patience and conscious awareness to navigate effectively."
-                    }
-                }
+                return self._fallback_analysis(profile_a, profile_b)
 
             cleaned = re.sub(r'^```json\s*|^```\s*|\s*```$', '', text.strip())
             result = json.loads(cleaned)
@@ -237,16 +438,68 @@ CRITICAL: Each field MUST meet its word count minimum. Be COMPREHENSIVE, DETAILE
             return result
         except Exception as e:
             print(f"❌ {e}")
-            return {
-                "themes": ["Complementary Dynamics", "Shared Growth Potential", "Balanced Energy"],
-                "deep_analysis": f"The compatibility between {profile_a['name']} and {profile_b['name']} demonstrates meaningful potential across multiple dimensions of personality and interpersonal dynamics. Their personality profiles suggest a relationship characterized by both natural synergy and constructive tension that could fuel growth.",
-                "perceived_similarity": "Both individuals demonstrate thoughtful, introspective approaches to life and relationships, suggesting strong mutual understanding potential.",
-                "compatibility_verdict": "This pairing shows moderate to strong compatibility with clear potential for a meaningful, balanced connection built on mutual respect and complementary strengths.",
-                "ui_cards": {
-                    "vibe_check": "A balanced connection with authentic mutual respect and room for both comfort and challenge.",
-                    "first_impression": "Natural chemistry balanced with intellectual alignment and genuine curiosity about each other.",
-                    "long_term_key": "Strong communication foundation, shared core values, and complementary approaches to growth and stability.",
-                    "green_flag": "Emotional maturity, genuine openness to growth, and balanced self-awareness in both individuals.",
-                    "red_flag": "Different communication styles and processing speeds that require patience and conscious awareness to navigate effectively."
-                }
-            }
+            return self._fallback_analysis(profile_a, profile_b)
+
+    async def stream_full_analysis(self, profile_a, profile_b, visual_score, hla_score, visual_details, hla_details):
+        """
+        Streaming generate_full_analysis. Async generator of (event, data):
+        ("field", {"field": "deep_analysis" | "ui_cards.vibe_check" | ..., "value": ...})
+        as each field closes, then ("complete", full analysis dict). Fields missing
+        from a cut-off or failed stream are filled from the canned fallback.
+        """
+        print(f"\n🔮 REPORT (streaming): {profile_a['name']} & {profile_b['name']}")
+
+        prompt = self._analysis_prompt(profile_a, profile_b, visual_score, hla_score)
+        loop = asyncio.get_running_loop()
+        chunks = asyncio.Queue()
+
+        def on_chunk(text):
+            loop.call_soon_threadsafe(chunks.put_nowait, text)
+
+        async def produce():
+            try:
+                await run_llm_call(
+                    self._stream_with_fallback,
+                    prompt,
+                    generation_config={
+                        'temperature': 0.85,  # High for detailed content
+                        'max_output_tokens': 8192  # Maximum for long analysis
+                    },
+                    on_chunk=on_chunk
+                )
+            except Exception as e:
+                print(f"❌ {e}")
+            finally:
+                chunks.put_nowait(None)
+
+        producer = asyncio.create_task(produce())
+        parser = IncrementalJSONParser()
+        try:
+            while True:
+                text = await chunks.get()
+                if text is None:
+                    break
+                for path, value in parser.feed(text):
+                    yield "field", {"field": ".".join(path), "value": value}
+        finally:
+            producer.cancel()
+
+        result = parser.result
+        if parser.complete:
+            print(f"✅ Report (COMPREHENSIVE!)\n")
+        else:
+            print(f"⚠️  Stream incomplete ({len(parser.buffer)} chars), filling missing fields from fallback\n")
+            for key, value in self._fallback_analysis(profile_a, profile_b).items():
+                if isinstance(value, dict):
+                    cards = result.setdefault(key, {})
+                    if not isinstance(cards, dict):
+                        continue
+                    for card, text in value.items():
+                        if card not in cards:
+                            cards[card] = text
+                            yield "field", {"field": f"{key}.{card}", "value": text}
+                elif key not in result:
+                    result[key] = value
+                    yield "field", {"field": key, "value": value}
+
+        yield "complete", result
@@ -3,11 +3,184 @@ HLA Service - Robust DNA file parser for 23andMe, Ancestry, and MyHeritage
 Handles .txt (tab-delimited) and .csv (comma-delimited) formats
 """
 
+import base64
+import codecs
+import gzip
 import logging
+import os
 import re
+import zipfile
+import zlib
+from collections import deque
+from functools import lru_cache
+
+import numpy as np
 
 logger = logging.getLogger(__name__)
 
+# Compact SNP storage: one 14-byte record per SNP, sorted by rsid
+SNP_DTYPE = np.dtype([('rsid', '<i8'), ('position', '<i4'), ('genotype', 'u1'), ('locus', 'u1')])
+SNP_LOCI = ['HLA-A', 'HLA-C', 'HLA-B', 'HLA-DRB1', 'HLA-DQA1', 'HLA-DQB1', 'HLA-OTHER']
+_ALLELES = 'ACGTDI-'
+SNP_GENOTYPES = [a for a in _ALLELES] + [a + b for a in _ALLELES for b in _ALLELES]
+_LOCUS_CODE = {locus: i for i, locus in enumerate(SNP_LOCI)}
+_GENOTYPE_CODE = {g: i for i, g in enumerate(SNP_GENOTYPES)}
+
+
+def _rsid_to_int(rsid: str) -> int:
+    # rs123 -> 123, 23andMe internal i123 -> -123
+    if rsid.startswith('rs') and rsid[2:].isdigit():
+        return int(rsid[2:])
+    if rsid.startswith('i') and rsid[1:].isdigit():
+        return -int(rsid[1:])
+    raise ValueError(f"Unsupported rsid: {rsid}")
+
+
+def _int_to_rsid(value: int) -> str:
+    return f"rs{value}" if value >= 0 else f"i{-value}"
+
+
+def snps_to_array(snps: list) -> np.ndarray:
+    """
+    Convert parsed SNP dicts to a SNP_DTYPE structured array sorted by rsid.
+    Raises ValueError for rsids, genotypes or loci the compact form can't hold.
+    """
+    arr = np.empty(len(snps), dtype=SNP_DTYPE)
+    for i, snp in enumerate(snps):
+        if snp['genotype'] not in _GENOTYPE_CODE:
+            raise ValueError(f"Unsupported genotype: {snp['genotype']}")
+        if snp['locus'] not in _LOCUS_CODE:
+            raise ValueError(f"Unsupported locus: {snp['locus']}")
+        arr[i] = (_rsid_to_int(snp['rsid']), snp['position'], _GENOTYPE_CODE[snp['genotype']], _LOCUS_CODE[snp['locus']])
+    return arr[np.argsort(arr['rsid'], kind='stable')]
+
+
+def array_to_snps(arr: np.ndarray) -> list:
+    """Convert a SNP_DTYPE array back to the parser's dict form, in position order."""
+    arr = arr[np.argsort(arr['position'], kind='stable')]
+    return [
+        {'rsid': _int_to_rsid(int(r)), 'position': int(p), 'genotype': SNP_GENOTYPES[g], 'locus': SNP_LOCI[l]}
+        for r, p, g, l in zip(arr['rsid'].tolist(), arr['position'].tolist(), arr['genotype'].tolist(), arr['locus'].tolist())
+    ]
+
+
+def pack_snp_array(arr: np.ndarray) -> dict:
+    """JSON-safe form of a SNP array for the storage layer."""
+    return {'snp_array': base64.b64encode(arr.astype(SNP_DTYPE).tobytes()).decode('ascii')}
+
+
+def unpack_snp_array(packed: dict) -> np.ndarray:
+    """Read-only SNP array from its packed form (decoded arrays are cached)."""
+    return _decode_snp_array(packed['snp_array'])
+
+
+@lru_cache(maxsize=int(os.getenv('HLA_ARRAY_CACHE_SIZE', '512')))
+def _decode_snp_array(encoded: str) -> np.ndarray:
+    # Decoding dominates a pairwise comparison, and the same genomes are compared over and over
+    return np.frombuffer(base64.b64decode(encoded), dtype=SNP_DTYPE)
+
+
+def is_packed_snps(data) -> bool:
+    return isinstance(data, dict) and 'snp_array' in data
+
+
+def round1(values: np.ndarray) -> np.ndarray:
+    """
+    round(x, 1) of Python floats for every element (np.round can differ at .x5 ties).
+    Visual and HLA scores are Python floats; personality and overall scores are
+    usually np.float64 in /api/analyze, whose round() is np.round.
+    """
+    values = np.asarray(values, dtype=np.float64)
+    rounded = np.round(values, 1)
+    scaled = values * 10
+    ties = np.flatnonzero(np.abs(scaled - np.floor(scaled) - 0.5) < 1e-6)
+    for i in ties:
+        rounded.flat[i] = round(float(values.flat[i]), 1)
+    return rounded
+
+
+class HLAPanel:
+    """
+    Stored genomes aligned to one shared rsid panel for one-vs-many scoring.
+
+    Each regular genome (packed SNP array without duplicate rsids, every rsid at
+    the position and locus the panel first saw it at) is kept as panel column
+    ids, genotype codes and locus codes, in the order the pairwise comparison
+    visits them; two regular genomes score the same in both directions.
+    Anything else (manual alleles, uncompressed lists, duplicate rsids, another
+    build's positions) is kept as stored and scored pairwise.
+    """
+
+    def __init__(self, genomes=()):
+        self.rsids = np.empty(0, dtype=np.int64)      # panel column -> rsid
+        self.positions = np.empty(0, dtype=np.int32)  # panel column -> position / locus first seen
+        self.loci = np.empty(0, dtype=np.intp)
+        self._sorter = np.empty(0, dtype=np.intp)
+        self.segments = {}                            # user_id -> (cols, genotype, locus)
+        self.irregular = {}                           # user_id -> stored value
+        self._stored = {}
+        for user_id, stored in genomes:
+            self.update(user_id, stored)
+
+    def __contains__(self, user_id) -> bool:
+        return user_id in self.segments or user_id in self.irregular
+
+    def __len__(self) -> int:
+        return len(self.segments) + len(self.irregular)
+
+    def update(self, user_id: str, stored):
+        """Add, replace or (stored=None) remove one user's genome."""
+        self.segments.pop(user_id, None)
+        self.irregular.pop(user_id, None)
+        self._stored.pop(user_id, None)
+        if not stored:
+            return
+        self._stored[user_id] = stored
+        if not is_packed_snps(stored):
+            self.irregular[user_id] = stored
+            return
+        arr = unpack_snp_array(stored)
+        if len(arr) > 1 and (arr['rsid'][1:] == arr['rsid'][:-1]).any():
+            self.irregular[user_id] = stored
+            return
+        arr = arr[np.argsort(np.ascontiguousarray(arr['position']), kind='stable')]
+        cols = self._columns(arr)
+        locus = arr['locus'].astype(np.intp)
+        if (self.positions[cols] != arr['position']).any() or (self.loci[cols] != locus).any():
+            self.irregular[user_id] = stored
+            return
+        self.segments[user_id] = (cols, arr['genotype'].copy(), locus)
+
+    def copy(self) -> 'HLAPanel':
+        """Independent panel to update while readers keep using this one (arrays are never modified in place)."""
+        panel = HLAPanel()
+        panel.rsids, panel.positions, panel.loci, panel._sorter = self.rsids, self.positions, self.loci, self._sorter
+        panel.segments, panel.irregular, panel._stored = dict(self.segments), dict(self.irregular), dict(self._stored)
+        return panel
+
+    def stored(self, user_id: str):
+        """The user's genome as stored in HLA_DB (None if there is none)."""
+        return self._stored.get(user_id)
+
+    def _columns(self, arr: np.ndarray) -> np.ndarray:
+        """Panel columns for a SNP array's rsids, growing the panel with unseen ones."""
+        rsids = arr['rsid']
+        known = self.rsids[self._sorter]
+        pos = np.minimum(np.searchsorted(known, rsids), max(len(known) - 1, 0))
+        found = (known[pos] == rsids) if len(known) else np.zeros(len(rsids), dtype=bool)
+        cols = np.empty(len(rsids), dtype=np.int64)
+        cols[found] = self._sorter[pos[found]]
+        new, first = np.unique(rsids[~found], return_index=True)
+        if len(new):
+            start = len(self.rsids)
+            self.rsids = np.concatenate([self.rsids, new])
+            self.positions = np.concatenate([self.positions, arr['position'][~found][first]])
+            self.loci = np.concatenate([self.loci, arr['locus'][~found][first].astype(np.intp)])
+            self._sorter = np.argsort(self.rsids, kind='stable')
+            cols[~found] = start + np.searchsorted(new, rsids[~found])
+        return cols
+
+
 class HLAService:
     """Calculate HLA genetic compatibility using chromosome 6 SNP data."""
     
@@ -25,6 +198,18 @@ class HLAService:
         'HLA-DQB1': (32700000, 32800000)
     }
     
+    # Class I (HLA-A, B, C) get 30% weight each
+    # Class II (DRB1, DQA1, DQB1) get 20% weight each
+    LOCUS_WEIGHTS = {
+        'HLA-A': 0.30,
+        'HLA-B': 0.30,
+        'HLA-C': 0.30,
+        'HLA-DRB1': 0.20,
+        'HLA-DQA1': 0.20,
+        'HLA-DQB1': 0.20
+    }
+    OTHER_LOCUS_WEIGHT = 0.10
+    
     def parse_hla_input(self, hla_data: str):
         """
         Parse HLA data from CSV (23andMe, Ancestry, MyHeritage) or manual input.
@@ -36,27 +221,14 @@ class HLAService:
                 logger.warning("⚠️ No HLA data provided or data too short")
                 return []
             
-            # Better format detection
             hla_data_trimmed = hla_data.strip()
+            kind = self._detect_format(hla_data_trimmed)
             
-            # Manual format: HLA-A*02:01 or just simple text with HLA
-            has_hla_allele = 'HLA-' in hla_data_trimmed and '*' in hla_data_trimmed
-            
-            # CSV format: has tabs/commas AND chromosome data
-            has_delimiters = '\t' in hla_data_trimmed or ',' in hla_data_trimmed
-            has_chr_markers = any(x in hla_data_trimmed.lower() for x in ['chromosome', 'rsid', 'rs', 'chr'])
-            
-            if has_hla_allele:
-                # Manual HLA format (even if short)
-                logger.info("   Detected: Manual HLA allele format")
+            if kind == 'manual':
                 return self._parse_manual_input(hla_data_trimmed)
-            elif has_delimiters and (has_chr_markers or '6' in hla_data_trimmed):
-                # CSV/TXT format
-                logger.info("   Detected: CSV/TXT DNA file format")
+            elif kind == 'csv':
                 return self._parse_csv_format(hla_data_trimmed)
             else:
-                logger.warning(f"⚠️ Unknown HLA data format (length: {len(hla_data_trimmed)})")
-                logger.warning(f"   Preview: {hla_data_trimmed[:100]}")
                 return []
                 
         except Exception as e:
@@ -65,91 +237,156 @@ class HLAService:
             traceback.print_exc()
             return []
     
+    def _detect_format(self, hla_data_trimmed: str):
+        """'manual', 'csv' or None (unknown) for stripped input text, or its first chunk."""
+        # Manual format: HLA-A*02:01 or just simple text with HLA
+        has_hla_allele = 'HLA-' in hla_data_trimmed and '*' in hla_data_trimmed
+        
+        # CSV format: has tabs/commas AND chromosome data
+        has_delimiters = '\t' in hla_data_trimmed or ',' in hla_data_trimmed
+        has_chr_markers = any(x in hla_data_trimmed.lower() for x in ['chromosome', 'rsid', 'rs', 'chr'])
+        
+        if has_hla_allele:
+            # Manual HLA format (even if short)
+            logger.info("   Detected: Manual HLA allele format")
+            return 'manual'
+        elif has_delimiters and (has_chr_markers or '6' in hla_data_trimmed):
+            # CSV/TXT format
+            logger.info("   Detected: CSV/TXT DNA file format")
+            return 'csv'
+        logger.warning(f"⚠️ Unknown HLA data format (length: {len(hla_data_trimmed)})")
+        logger.warning(f"   Preview: {hla_data_trimmed[:100]}")
+        return None
+    
     def _parse_csv_format(self, csv_data: str):
         """
         Extract chromosome 6 SNPs from CSV/TXT files.
         Supports: 23andMe (.txt, tab), Ancestry (.txt, tab), MyHeritage (.csv, comma)
         """
-        hla_snps = []
-        lines = csv_data.strip().split('\n')
+        parser = HLAStreamParser(self, fmt='csv')
+        parser.feed(csv_data.strip().encode('utf-8'))
+        return parser.close()
+    
+    def _parse_csv_line(self, line: str):
+        """One CSV/TXT row -> HLA-region SNP dict, or None for anything else."""
+        line = line.strip()
         
-        logger.info(f"📄 Processing {len(lines)} lines from DNA file")
+        # Skip empty lines
+        if not line:
+            return None
         
-        for line_num, line in enumerate(lines, 1):
-            line = line.strip()
-            
-            # Skip empty lines
-            if not line:
-                continue
-            
-            # Skip comment/header lines
-            if line.startswith('#') or line.lower().startswith('rsid'):
-                continue
-            
-            try:
-                # Auto-detect delimiter
-                if '\t' in line:
-                    parts = [p.strip() for p in line.split('\t')]
-                else:
-                    parts = [p.strip() for p in line.split(',')]
-                
-                # Need at least 4 parts
-                if len(parts) < 4:
-                    continue
-                
-                # Extract fields (handle both 4-col and 5-col formats)
-                rsid = parts[0]
-                chrom_raw = parts[1]
-                
-                # Chromosome might be numeric or have 'chr' prefix
-                chrom = chrom_raw.replace('chr', '').replace('Chr', '').strip()
-                
-                # Skip non-chromosome-6 entries
-                if chrom != '6':
-                    continue
-                
-                # Position (column 2)
-                try:
-                    position = int(parts[2])
-                except (ValueError, IndexError):
-                    continue
-                
-                # Genotype (column 3 or combined from 3+4)
-                if len(parts) >= 5:
-                    # 5-column format (Ancestry): allele1, allele2 in separate columns
-                    allele1 = parts[3].strip()
-                    allele2 = parts[4].strip()
-                    genotype = allele1 + allele2
-                else:
-                    # 4-column format (23andMe, MyHeritage): combined genotype
-                    genotype = parts[3].strip()
-                
-                # Validate genotype (should be 2 letters or -- for no-call)
-                if len(genotype) < 1 or genotype == '00':
-                    continue
-                
-                # Filter: Only HLA region
-                if self.HLA_REGION_START <= position <= self.HLA_REGION_END:
-                    locus = self._position_to_locus(position)
-                    hla_snps.append({
-                        'rsid': rsid,
-                        'position': position,
-                        'genotype': genotype,
-                        'locus': locus
-                    })
-                    
-            except Exception as e:
-                # Skip problematic lines without crashing
-                if line_num <= 20:  # Only log first 20 errors to avoid spam
-                    logger.debug(f"⚠️ Line {line_num} parse error: {e}")
-                continue
+        # Skip comment/header lines
+        if line.startswith('#') or line.lower().startswith('rsid'):
+            return None
+        
+        # Auto-detect delimiter
+        if '\t' in line:
+            parts = [p.strip() for p in line.split('\t')]
+        else:
+            parts = [p.strip() for p in line.split(',')]
         
+        # Need at least 4 parts
+        if len(parts) < 4:
+            return None
+        
+        # Extract fields (handle both 4-col and 5-col formats)
+        rsid = parts[0]
+        chrom_raw = parts[1]
+        
+        # Chromosome might be numeric or have 'chr' prefix
+        chrom = chrom_raw.replace('chr', '').replace('Chr', '').strip()
+        
+        # Skip non-chromosome-6 entries
+        if chrom != '6':
+            return None
+        
+        # Position (column 2)
+        try:
+            position = int(parts[2])
+        except (ValueError, IndexError):
+            return None
+        
+        # Genotype (column 3 or combined from 3+4)
+        if len(parts) >= 5:
+            # 5-column format (Ancestry): allele1, allele2 in separate columns
+            allele1 = parts[3].strip()
+            allele2 = parts[4].strip()
+            genotype = allele1 + allele2
+        else:
+            # 4-column format (23andMe, MyHeritage): combined genotype
+            genotype = parts[3].strip()
+        
+        # Validate genotype (should be 2 letters or -- for no-call)
+        if len(genotype) < 1 or genotype == '00':
+            return None
+        
+        # Filter: Only HLA region
+        if not self.HLA_REGION_START <= position <= self.HLA_REGION_END:
+            return None
+        return {
+            'rsid': rsid,
+            'position': position,
+            'genotype': genotype,
+            'locus': self._position_to_locus(position)
+        }
+    
+    def _log_extracted(self, hla_snps: list):
         logger.info(f"✅ Extracted {len(hla_snps)} HLA-region SNPs from chromosome 6")
         
         if len(hla_snps) == 0:
             logger.warning("⚠️ No chromosome 6 SNPs found in HLA region. File may be incorrect format.")
-        
-        return hla_snps
+    
+    def stream_parser(self, max_bytes: int = None) -> 'HLAStreamParser':
+        """Incremental parse_hla_input() for uploads fed in chunks (see HLAStreamParser)."""
+        return HLAStreamParser(self, max_bytes)
+    
+    def parse_dna_file(self, fileobj, max_bytes: int = None, chunk_size: int = None,
+                       executor=None, parallel_min_bytes: int = None):
+        """
+        parse_hla_input() for an uploaded raw-data file: plain text, .gz or .zip.
+
+        Archives are decompressed chunk by chunk straight into the parser, so
+        neither the file nor its decompressed text is ever held whole;
+        max_bytes caps the decompressed size. Reading stops early once the
+        parser is past the HLA region of a sorted file.
+
+        Given a process pool, a file of parallel_min_bytes or more (on disk or
+        decompressed) that turns out not to be sorted is finished across the
+        pool's workers (see HLAStreamParser.feed_parallel); smaller files and
+        sorted ones stay inline.
+        """
+        size = fileobj.seek(0, os.SEEK_END)
+        fileobj.seek(0)
+        parser = self.stream_parser(max_bytes)
+        chunks = dna_file_chunks(fileobj, chunk_size or DNA_CHUNK_BYTES)
+        for chunk in chunks:
+            parser.feed(chunk)
+            if parser.done:
+                break
+            if (executor is not None and parallel_min_bytes is not None and parser.scanning_all
+                    and max(size, parser.bytes_read) >= parallel_min_bytes):
+                parser.feed_parallel(chunks, executor)
+                break
+        return parser.close()
+    
+    def to_storage(self, parsed):
+        """
+        Compact form of parse_hla_input() output for HLA_DB: SNP lists become a
+        packed SNP_DTYPE array; manual alleles (and anything the array can't hold) stay as-is.
+        """
+        if not isinstance(parsed, list) or not parsed:
+            return parsed
+        try:
+            return pack_snp_array(snps_to_array(parsed))
+        except (ValueError, KeyError) as e:
+            logger.warning(f"⚠️ Keeping SNP list uncompressed: {e}")
+            return parsed
+    
+    def from_storage(self, stored):
+        """Inverse of to_storage(): the parser's list-of-dicts / manual form."""
+        if is_packed_snps(stored):
+            return array_to_snps(unpack_snp_array(stored))
+        return stored
     
     def _parse_manual_input(self, manual_text: str) -> dict:
         """Parse manually typed HLA alleles: HLA-A*02:01, HLA-B*44:03, etc."""
@@ -248,37 +485,19 @@ class HLAService:
         """Calculate from SNP data (list of dicts with rsid, position, genotype)."""
         logger.info("🔬 Calculating from SNP data")
         
-        # Handle list format (from CSV parsing)
-        if not isinstance(snps_a, list) or not isinstance(snps_b, list):
+        # Handle list format (from CSV parsing) and the packed array form from HLA_DB
+        if not isinstance(snps_a, list) and not is_packed_snps(snps_a) or \
+           not isinstance(snps_b, list) and not is_packed_snps(snps_b):
             logger.warning("⚠️ SNP data not in list format")
             return self._default_compatibility()
         
-        if len(snps_a) == 0 or len(snps_b) == 0:
-            logger.warning(f"⚠️ Empty SNP lists: A={len(snps_a)}, B={len(snps_b)}")
+        columns_a, columns_b, locus_names = self._snp_columns(snps_a, snps_b)
+        if len(columns_a[0]) == 0 or len(columns_b[0]) == 0:
+            logger.warning(f"⚠️ Empty SNP lists: A={len(columns_a[0])}, B={len(columns_b[0])}")
             return self._default_compatibility()
         
-        # Build lookup by rsid for person B
-        snps_b_lookup = {snp['rsid']: snp for snp in snps_b}
-        
-        # Calculate per-locus dissimilarity
-        locus_stats = {}
-        
-        for snp_a in snps_a:
-            rsid = snp_a['rsid']
-            if rsid not in snps_b_lookup:
-                continue
-            
-            snp_b = snps_b_lookup[rsid]
-            locus = snp_a['locus']
-            
-            if locus not in locus_stats:
-                locus_stats[locus] = {'matches': 0, 'mismatches': 0}
-            
-            # Compare genotypes
-            if snp_a['genotype'] == snp_b['genotype']:
-                locus_stats[locus]['matches'] += 1
-            else:
-                locus_stats[locus]['mismatches'] += 1
+        # Per-locus match/mismatch counts over the rsids both people have
+        locus_stats = self._locus_stats(columns_a, columns_b, locus_names)
         
         if not locus_stats:
             logger.warning("⚠️ No shared SNPs found between the two people")
@@ -288,22 +507,11 @@ class HLAService:
         total_dissim = 0
         total_weight = 0
         
-        # Class I (HLA-A, B, C) get 30% weight each
-        # Class II (DRB1, DQA1, DQB1) get 20% weight each
-        weights = {
-            'HLA-A': 0.30,
-            'HLA-B': 0.30,
-            'HLA-C': 0.30,
-            'HLA-DRB1': 0.20,
-            'HLA-DQA1': 0.20,
-            'HLA-DQB1': 0.20
-        }
-        
         for locus, stats in locus_stats.items():
             total_snps = stats['matches'] + stats['mismatches']
             if total_snps > 0:
                 locus_dissim = stats['mismatches'] / total_snps
-                weight = weights.get(locus, 0.10)
+                weight = self.LOCUS_WEIGHTS.get(locus, self.OTHER_LOCUS_WEIGHT)
                 total_dissim += locus_dissim * weight
                 total_weight += weight
         
@@ -325,6 +533,227 @@ class HLAService:
             'locus_breakdown': locus_stats
         }
     
+    def _snp_columns(self, snps_a, snps_b):
+        """
+        (rsid, genotype, locus, order) columns for both people plus the locus
+        names; order ranks each SNP in the sequence the pairwise loop visits them.
+        """
+        if is_packed_snps(snps_a) and is_packed_snps(snps_b):
+            return self._packed_columns(snps_a), self._packed_columns(snps_b), SNP_LOCI
+        
+        # Dict lists: give each distinct rsid / genotype / locus string an integer code
+        snps_a, snps_b = self.from_storage(snps_a), self.from_storage(snps_b)
+        # (B first, so B's rsid codes usually come out already sorted)
+        rsids, genotypes, loci = {}, {}, {}
+        columns = {}
+        for side, snps in (('b', snps_b), ('a', snps_a)):
+            columns[side] = (
+                np.array([rsids.setdefault(snp['rsid'], len(rsids)) for snp in snps], dtype=np.int64),
+                np.array([genotypes.setdefault(snp['genotype'], len(genotypes)) for snp in snps], dtype=np.int64),
+                np.array([loci.setdefault(snp['locus'], len(loci)) for snp in snps], dtype=np.intp),
+                np.arange(len(snps))
+            )
+        return columns['a'], columns['b'], list(loci)
+    
+    def _packed_columns(self, packed) -> tuple:
+        arr = unpack_snp_array(packed)
+        # Stored sorted by rsid; the pairwise path walks them in (stable) position order
+        order = arr['position'].astype(np.int64) * len(arr) + np.arange(len(arr))
+        return arr['rsid'].copy(), arr['genotype'].copy(), arr['locus'].astype(np.intp), order
+    
+    def _locus_stats(self, columns_a, columns_b, locus_names) -> dict:
+        """
+        Sorted-rsid intersection of A and B, grouped by A's locus. Keys are
+        ordered by each locus' first shared SNP in A, as the pairwise loop inserts them.
+        """
+        rsid_a, genotype_a, locus_a, order_a = columns_a
+        rsid_b, genotype_b = columns_b[:2]
+        if len(rsid_b) > 1 and not (rsid_b[1:] >= rsid_b[:-1]).all():
+            by_rsid = np.argsort(rsid_b, kind='stable')
+            rsid_b, genotype_b = rsid_b[by_rsid], genotype_b[by_rsid]
+        
+        # For duplicate rsids in B the last one wins, like a dict lookup
+        last = np.append(rsid_b[1:] != rsid_b[:-1], True)
+        rsid_b, genotype_b = rsid_b[last], genotype_b[last]
+        
+        found = np.minimum(np.searchsorted(rsid_b, rsid_a), len(rsid_b) - 1)
+        shared = rsid_b[found] == rsid_a
+        loci = locus_a[shared]
+        if not len(loci):
+            return {}
+        same = genotype_a[shared] == genotype_b[found[shared]]
+        order = order_a[shared]
+        
+        totals = np.bincount(loci, minlength=len(locus_names))
+        matches = np.bincount(loci[same], minlength=len(locus_names))
+        codes = np.flatnonzero(totals)
+        first = [order[loci == c].min() for c in codes]
+        return {
+            locus_names[c]: {'matches': int(matches[c]), 'mismatches': int(totals[c] - matches[c])}
+            for c in codes[np.argsort(first)]
+        }
+    
+    def compatibility_one_to_many(self, panel: HLAPanel, user_id: str, candidate_ids: list) -> np.ndarray:
+        """
+        compatibility_score of user_id against each candidate, equal to what
+        calculate_hla_compatibility returns pairwise (50.0 without data).
+
+        Regular genomes in the panel are scored in one pass: the user's genotypes
+        are spread over the panel, every candidate SNP looks up its column, and
+        per-(candidate, locus) counts come from one bincount. Locus weights and
+        the Wedekind curve are then applied to all candidates at once.
+        """
+        scores = np.full(len(candidate_ids), 50.0)
+        if user_id not in panel:
+            return scores
+        if user_id not in panel.segments:
+            me = panel.stored(user_id)
+            manual = isinstance(me, dict) and 'manual_alleles' in me
+            for i, candidate in enumerate(candidate_ids):
+                # Manual alleles only ever score against other manual alleles
+                other = panel.irregular.get(candidate) if manual else panel.stored(candidate)
+                if other:
+                    scores[i] = self.calculate_hla_compatibility(me, other)['compatibility_score']
+            return scores
+
+        regular = [i for i, c in enumerate(candidate_ids) if c in panel.segments]
+        irregular = [i for i, c in enumerate(candidate_ids) if c in panel.irregular]
+        if irregular:
+            me = panel.stored(user_id)
+            for i in irregular:
+                scores[i] = self.calculate_hla_compatibility(me, panel.irregular[candidate_ids[i]])['compatibility_score']
+        if not regular:
+            return scores
+
+        # The user's genome spread over the panel: genotype code + 1 (0 = not typed), locus, visit order
+        my_cols, my_genotype, my_locus = panel.segments[user_id]
+        width = len(panel.rsids)
+        genotype_at = np.zeros(width, dtype=np.int16)
+        genotype_at[my_cols] = my_genotype.astype(np.int16) + 1
+        locus_at = np.zeros(width, dtype=np.intp)
+        locus_at[my_cols] = my_locus
+        order_at = np.zeros(width, dtype=np.int64)
+        order_at[my_cols] = np.arange(len(my_cols))
+
+        segments = [panel.segments[candidate_ids[i]] for i in regular]
+        cols = np.concatenate([seg[0] for seg in segments])
+        genotype = np.concatenate([seg[1] for seg in segments]).astype(np.int16) + 1
+        owner = np.repeat(np.arange(len(segments)), [len(seg[0]) for seg in segments])
+
+        mine = genotype_at[cols]
+        shared = mine > 0
+        cols, owner, same = cols[shared], owner[shared], mine[shared] == genotype[shared]
+
+        n, n_loci = len(segments), len(SNP_LOCI)
+        key = owner * n_loci + locus_at[cols]
+        totals = np.bincount(key, minlength=n * n_loci).reshape(n, n_loci)
+        matches = np.bincount(key[same], minlength=n * n_loci).reshape(n, n_loci)
+        first = np.full(n * n_loci, np.iinfo(np.int64).max)
+        np.minimum.at(first, key, order_at[cols])
+
+        # Sum loci in the order the pairwise loop meets them, so floats round the same way
+        visit = np.argsort(first.reshape(n, n_loci), axis=1, kind='stable')
+        weights = np.array([self.LOCUS_WEIGHTS.get(locus, self.OTHER_LOCUS_WEIGHT) for locus in SNP_LOCI])
+        rows = np.arange(n)
+        total_dissim = np.zeros(n)
+        total_weight = np.zeros(n)
+        for step in range(n_loci):
+            locus = visit[:, step]
+            count = totals[rows, locus]
+            has = count > 0
+            mismatches = (count - matches[rows, locus]).astype(np.float64)
+            locus_dissim = np.divide(mismatches, count, out=np.zeros(n), where=has)
+            total_dissim = np.where(has, total_dissim + locus_dissim * weights[locus], total_dissim)
+            total_weight = np.where(has, total_weight + weights[locus], total_weight)
+
+        any_shared = total_weight > 0
+        dissim = np.divide(total_dissim, total_weight, out=np.zeros(n), where=any_shared)
+        score = np.clip(100 * (1 - (np.abs(dissim - 0.55) / 0.55)), 0, 100)
+        scores[regular] = np.where(any_shared, round1(score), 50.0)
+        return scores
+    
+    def compatibility_block(self, panel: HLAPanel, row_ids: list, col_ids: list) -> np.ndarray:
+        """
+        compatibility_score of every (row_ids[i], col_ids[j]) pair, equal to
+        compatibility_one_to_many row by row (50.0 without data).
+
+        Pairs of regular genomes are counted with per-locus matrix products over
+        the panel columns the rows have typed. Irregular genomes, and the rare
+        regular pairs whose unrounded score sits on a rounding tie (where the
+        order the loci are summed in can matter), go through compatibility_one_to_many.
+        """
+        scores = np.full((len(row_ids), len(col_ids)), 50.0)
+        regular_rows = [i for i, u in enumerate(row_ids) if u in panel.segments]
+        regular_cols = [j for j, u in enumerate(col_ids) if u in panel.segments]
+        irregular_cols = [j for j, u in enumerate(col_ids) if u in panel.irregular]
+        for i, user_id in enumerate(row_ids):
+            if user_id in panel.irregular:
+                scores[i] = self.compatibility_one_to_many(panel, user_id, col_ids)
+        if irregular_cols:
+            others = [col_ids[j] for j in irregular_cols]
+            for i in regular_rows:
+                scores[i, irregular_cols] = self.compatibility_one_to_many(panel, row_ids[i], others)
+        if not regular_rows or not regular_cols:
+            return scores
+
+        # Dense genotype codes (+1, 0 = not typed) and loci over the columns the rows have typed
+        rows = [panel.segments[row_ids[i]] for i in regular_rows]
+        width = np.unique(np.concatenate([seg[0] for seg in rows]))
+        g_a, l_a = self._dense_segments(rows, width)
+        g_b, _ = self._dense_segments([panel.segments[col_ids[j]] for j in regular_cols], width)
+        typed_b = (g_b > 0).astype(np.float32)
+        codes = np.unique(g_a[g_a > 0])
+
+        n_a, n_b = len(regular_rows), len(regular_cols)
+        total_dissim = np.zeros((n_a, n_b))
+        total_weight = np.zeros((n_a, n_b))
+        for k, locus in enumerate(SNP_LOCI):
+            # Grouped by the row's locus, as the pairwise path groups by A's
+            mine = l_a == k
+            used = mine.any(axis=0)
+            if not used.any():
+                continue
+            mine, la, lb, tb = mine[:, used], g_a[:, used], g_b[:, used], typed_b[:, used]
+            # Counts stay far below 2**24, so float32 products are exact
+            shared = mine.astype(np.float32) @ tb.T
+            matches = np.zeros_like(shared)
+            for code in codes:
+                matches += ((la == code) & mine).astype(np.float32) @ (lb == code).astype(np.float32).T
+            has = shared > 0
+            mismatches = (shared - matches).astype(np.float64)
+            locus_dissim = np.divide(mismatches, shared.astype(np.float64), out=np.zeros((n_a, n_b)), where=has)
+            weight = self.LOCUS_WEIGHTS.get(locus, self.OTHER_LOCUS_WEIGHT)
+            total_dissim = np.where(has, total_dissim + locus_dissim * weight, total_dissim)
+            total_weight = np.where(has, total_weight + weight, total_weight)
+
+        any_shared = total_weight > 0
+        dissim = np.divide(total_dissim, total_weight, out=np.zeros((n_a, n_b)), where=any_shared)
+        score = np.clip(100 * (1 - (np.abs(dissim - 0.55) / 0.55)), 0, 100)
+        scores[np.ix_(regular_rows, regular_cols)] = np.where(any_shared, round1(score), 50.0)
+
+        # Loci are summed in panel order here, in first-shared-SNP order pairwise:
+        # the last bit can differ, which only shows on a rounding tie
+        scaled = score * 10
+        ties = any_shared & (np.abs(scaled - np.floor(scaled) - 0.5) < 1e-6)
+        for a in np.flatnonzero(ties.any(axis=1)):
+            cols = [regular_cols[b] for b in np.flatnonzero(ties[a])]
+            i = regular_rows[a]
+            scores[i, cols] = self.compatibility_one_to_many(panel, row_ids[i], [col_ids[j] for j in cols])
+        return scores
+
+    @staticmethod
+    def _dense_segments(segments: list, width: np.ndarray) -> tuple:
+        """Genotype codes + 1 (0 = not typed) and loci (-1) of panel segments over the given panel columns."""
+        genotypes = np.zeros((len(segments), len(width)), dtype=np.int16)
+        loci = np.full((len(segments), len(width)), -1, dtype=np.int8)
+        for i, (cols, genotype, locus) in enumerate(segments):
+            at = np.searchsorted(width, cols)
+            inside = at < len(width)
+            inside[inside] = width[at[inside]] == cols[inside]
+            genotypes[i, at[inside]] = genotype[inside].astype(np.int16) + 1
+            loci[i, at[inside]] = locus[inside]
+        return genotypes, loci
+    
     def _apply_wedekind_curve(self, dissimilarity: float) -> float:
         """
         Apply Wedekind optimal curve (1995 T-shirt study).
@@ -354,3 +783,390 @@ class HLAService:
             if start <= position <= end:
                 return locus
         return 'HLA-OTHER'
+
+
+DNA_CHUNK_BYTES = 1024 * 1024
+PARALLEL_RANGE_BYTES = 8 * 1024 * 1024
+
+
+class DNAFileTooLarge(ValueError):
+    """A streamed DNA file went past the parser's max_bytes."""
+
+
+class DNAArchiveError(ValueError):
+    """A .zip/.gz DNA upload that cannot be decompressed."""
+
+
+def dna_file_chunks(fileobj, chunk_size: int = DNA_CHUNK_BYTES):
+    """
+    Decompressed content of a seekable DNA upload, chunk_size bytes at a time.
+    gzip and zip are recognised by their magic bytes; a zip yields its largest
+    .txt/.csv/.tsv member (or largest file), anything else is passed through.
+    """
+    magic = fileobj.read(4)
+    fileobj.seek(0)
+    if magic[:2] != b'\x1f\x8b' and magic != b'PK\x03\x04':
+        while chunk := fileobj.read(chunk_size):
+            yield chunk
+        return
+    try:
+        if magic[:2] == b'\x1f\x8b':
+            source = gzip.GzipFile(fileobj=fileobj, mode='rb')
+        else:
+            archive = zipfile.ZipFile(fileobj)
+            source = archive.open(_zip_member(archive))
+        while chunk := source.read(chunk_size):
+            yield chunk
+    except (OSError, EOFError, RuntimeError, zipfile.BadZipFile, zlib.error) as e:
+        raise DNAArchiveError(f"Could not decompress DNA file: {e}") from e
+
+
+def _zip_member(archive: zipfile.ZipFile) -> zipfile.ZipInfo:
+    files = [i for i in archive.infolist() if not i.is_dir() and not i.filename.startswith('__MACOSX/')]
+    if not files:
+        raise DNAArchiveError("Zip archive has no files")
+    text = [i for i in files if i.filename.lower().endswith(('.txt', '.csv', '.tsv'))]
+    return max(text or files, key=lambda i: i.file_size)
+
+
+_CHROM_RANK = {b'X': 23, b'Y': 24, b'XY': 25, b'MT': 26, b'M': 26}
+# Bytes str.strip() drops at the start of a line that bytes.strip() keeps
+_ODD_LEAD = frozenset(range(0x1c, 0x20)) | frozenset(range(0x80, 0x100))
+_SPACE_BYTES = np.zeros(256, dtype=bool)
+_SPACE_BYTES[[9, 11, 12, 13, 32, *range(0x1c, 0x20), *range(0x80, 0x100)]] = True
+_PLAIN_BYTES = np.zeros(256, dtype=bool)
+_PLAIN_BYTES[[*range(ord('0'), ord('9') + 1), *range(ord('A'), ord('Z') + 1)]] = True
+_MAX_POSITION_DIGITS = 9
+_PLAIN_CHROM = re.compile(rb'("?)(chr)?[0-9A-Z]{1,2}\1')
+
+
+def _row_key(line: bytes):
+    """(chromosome rank, position) of a raw data row, None for headers and anything unreadable."""
+    line = line.strip()
+    if not line or line[0] in _ODD_LEAD:
+        return None
+    parts = line.split(b'\t' if b'\t' in line else b',')
+    if len(parts) < 4:
+        return None
+    chrom = parts[1].strip().replace(b'chr', b'').replace(b'Chr', b'').strip()
+    rank = int(chrom) if chrom.isdigit() else _CHROM_RANK.get(chrom.upper())
+    if rank is None:
+        return None
+    try:
+        return rank, int(parts[2])
+    except ValueError:
+        return None
+
+
+def _detect_layout(block: bytes):
+    """
+    (delimiter byte, chromosome prefix, suffix) from the first data row, e.g.
+    (tab, b'', b'') for '6', (tab, b'chr', b'') for 'chr6' or (comma, b'"', b'"')
+    for '"6"'. None if the block has no such row.
+    """
+    for line in block[:64 * 1024].split(b'\n')[:-1]:
+        line = line.strip()
+        if not line or line.startswith(b'#'):
+            continue
+        delim = b'\t' if b'\t' in line else b','
+        parts = line.split(delim)
+        match = _PLAIN_CHROM.fullmatch(parts[1].strip()) if len(parts) >= 4 else None
+        if match:
+            quote = match.group(1)
+            return delim[0], quote + (match.group(2) or b''), quote
+    return None
+
+
+def _scan_rows(block: bytes, delim: int, prefix: bytes, suffix: bytes):
+    """
+    Rows of a block of whole lines that _parse_csv_line() could accept, found
+    with array operations on the raw bytes; no object is made for any other row.
+
+    A row is plain when it does not start with whitespace, splits on delim, and
+    its chromosome field is prefix + one or two of [0-9A-Z] + suffix. Plain rows
+    are decided here: only unquoted chromosome 6 rows with at least four fields
+    and an all-digit position are returned, with that position. Every other row
+    is returned with position -1 and is left to the exact parser.
+
+    Returns (starts, ends, positions), in file order.
+    """
+    arr = np.frombuffer(block, dtype=np.uint8)
+    size = len(arr)
+    if not size:
+        return np.empty(0, np.intp), np.empty(0, np.intp), np.empty(0, np.int64)
+    breaks = np.flatnonzero(arr == 10)
+    starts = np.concatenate(([0], breaks + 1))
+    ends = np.append(breaks, size)
+    delims = np.append(np.flatnonzero(arr == delim), [size, size, size])
+    first = np.searchsorted(delims, starts)
+    chrom_at = delims[first] + 1
+    chrom_len = delims[first + 1] - chrom_at
+    has_chrom = delims[first + 1] < ends
+
+    nonempty = ends > starts
+    odd = nonempty & _SPACE_BYTES[arr[np.minimum(starts, size - 1)]]
+    if delim == 9:
+        odd |= nonempty & (delims[first] >= ends)  # No tab: the row splits on commas
+    elif 9 in arr:
+        tabs = np.append(np.flatnonzero(arr == 9), size)
+        odd |= tabs[np.searchsorted(tabs, starts)] < ends
+
+    def byte_at(offset):
+        return arr[np.minimum(chrom_at + offset, size - 1)]
+
+    n, m = len(prefix), len(suffix)
+    plain = has_chrom & ~odd & (chrom_len >= n + m + 1) & (chrom_len <= n + m + 2)
+    for i, ch in enumerate(prefix):
+        plain &= byte_at(i) == ch
+    for i, ch in enumerate(suffix):
+        plain &= byte_at(chrom_len - m + i) == ch
+    plain &= _PLAIN_BYTES[byte_at(n)] & ((chrom_len == n + m + 1) | _PLAIN_BYTES[byte_at(n + 1)])
+    chr6 = plain & (chrom_len == n + 1) & (byte_at(n) == ord('6')) & (delims[first + 2] < ends)
+    if suffix:
+        chr6[:] = False  # A quoted '"6"' never reads as chromosome 6
+
+    rows = np.flatnonzero(chr6 | (has_chrom & ~plain) | odd)
+    positions = np.full(len(rows), -1, dtype=np.int64)
+    six = chr6[rows]
+    at = delims[first[rows[six]] + 1] + 1
+    length = delims[first[rows[six]] + 2] - at
+    value = np.zeros(len(at), dtype=np.int64)
+    digits = (length >= 1) & (length <= _MAX_POSITION_DIGITS)
+    for i in range(_MAX_POSITION_DIGITS):
+        d = arr[np.minimum(at + i, size - 1)].astype(np.int64) - ord('0')
+        inside = i < length
+        digits &= ~inside | ((d >= 0) & (d <= 9))
+        value = np.where(inside, value * 10 + d, value)
+    positions[np.flatnonzero(six)[digits]] = value[digits]
+    return starts[rows], ends[rows], positions
+
+
+class HLAStreamParser:
+    """
+    parse_hla_input() over a byte stream: feed() chunks as they arrive, then close().
+
+    The format is detected from the first DETECT_BYTES. CSV/TXT input is then
+    scanned a block of whole lines at a time and only HLA-region rows are kept,
+    so memory is one block plus the extracted SNPs whatever the file size.
+    Manual allele text is short and is buffered whole.
+
+    The delimiter and chromosome field layout are read once from the first rows;
+    _scan_rows() then picks out chromosome 6 rows on the raw bytes and only
+    HLA-region rows are decoded and parsed. Vendor exports are sorted by
+    chromosome and position, so the scan also stops (done) once a whole block
+    has gone by past the HLA region, after at least MIN_ORDERED_ROWS rows have
+    been seen in order. Order is checked on block edges and on every row
+    looked at; once it breaks, the rest of the file is scanned in full.
+    """
+
+    DETECT_BYTES = 64 * 1024
+    BLOCK_BYTES = 64 * 1024
+    MIN_ORDERED_ROWS = 1000      # In-order rows seen before the scan may stop early
+
+    def __init__(self, service: HLAService, max_bytes: int = None, fmt: str = ''):
+        self.service = service
+        self.max_bytes = max_bytes
+        self.bytes_read = 0
+        self.lines = 0
+        self.snps = []
+        self.done = False        # Sorted input, already past the HLA region
+        self._pending = b''      # head before detection, then the trailing partial block
+        self._kind = fmt         # '' until detected, then 'csv', 'manual' or None (unknown)
+        self._layout = None      # (delimiter byte, chromosome prefix, suffix) once known
+        self._sorted = True
+        self._ordered_rows = 0
+        self._last_key = (0, 0)
+        self._region = ((6, service.HLA_REGION_START), (6, service.HLA_REGION_END))
+
+    @property
+    def scanning_all(self) -> bool:
+        """CSV input already known not to be sorted: every remaining block has to be scanned."""
+        return self._kind == 'csv' and not self._sorted
+
+    def feed(self, chunk: bytes):
+        """Parse the next chunk; raises DNAFileTooLarge once max_bytes is passed."""
+        self._count(chunk)
+        if not self.done:
+            self._push(chunk)
+
+    def feed_parallel(self, chunks, executor, range_bytes: int = PARALLEL_RANGE_BYTES, max_in_flight: int = 8):
+        """
+        Parse the rest of the stream on a process pool. chunks are cut at line
+        boundaries into ranges of about range_bytes, each range is scanned by a
+        worker, and the SNPs are appended in range order, so the result is the
+        one a serial scan gives. At most max_in_flight ranges are held at once.
+        """
+        in_flight = deque()
+
+        def collect():
+            snps, lines = in_flight.popleft().result()
+            self.snps.extend(snps)
+            self.lines += lines
+
+        def submit(block: bytes):
+            if len(in_flight) >= max_in_flight:
+                collect()
+            in_flight.append(executor.submit(_parse_range, block, self._layout))
+
+        parts, size = [self._pending], len(self._pending)
+        self._pending = b''
+        try:
+            for chunk in chunks:
+                self._count(chunk)
+                parts.append(chunk)
+                size += len(chunk)
+                if size >= range_bytes:
+                    data = b''.join(parts)
+                    cut = data.rfind(b'\n') + 1
+                    if cut:
+                        submit(data[:cut])
+                    parts, size = [data[cut:]], len(data) - cut
+            data = b''.join(parts)
+            if data:
+                submit(data)
+            while in_flight:
+                collect()
+        finally:
+            for future in in_flight:
+                future.cancel()
+
+    def _count(self, chunk: bytes):
+        self.bytes_read += len(chunk)
+        if self.max_bytes is not None and self.bytes_read > self.max_bytes:
+            raise DNAFileTooLarge(f"DNA file is larger than {self.max_bytes} bytes")
+
+    def close(self):
+        """Finish the stream and return what parse_hla_input() would for the whole text."""
+        if not self.done:
+            self._push(b'', final=True)
+        if self._kind == 'manual':
+            return self.service._parse_manual_input(self._pending.decode('utf-8').strip())
+        if self._kind != 'csv':
+            return []
+        stopped = ', stopped after the HLA region' if self.done else ''
+        logger.info(f"📄 Scanned DNA file ({self.bytes_read / 1024 / 1024:.1f} MB): {self.lines} lines parsed{stopped}")
+        self.service._log_extracted(self.snps)
+        return self.snps
+
+    def _push(self, chunk: bytes, final: bool = False):
+        if self._kind is None:
+            return  # Unknown format: drain the rest of the stream
+        data = self._pending + chunk if self._pending else chunk
+        if self._kind == '':
+            if len(data) < self.DETECT_BYTES and not final:
+                self._pending = data
+                return
+            self._kind = self._detect(data, final)
+        if self._kind != 'csv':
+            self._pending = data
+            return
+        cut = len(data) if final else data.rfind(b'\n') + 1
+        if cut == 0 or (len(data) < self.BLOCK_BYTES and not final):
+            self._pending = data
+            return
+        self._pending = data[cut:]
+        self._scan(data[:cut] if cut < len(data) else data)
+
+    def _detect(self, data: bytes, final: bool):
+        logger.info("🧬 Parsing HLA data...")
+        head = codecs.utf_8_decode(data[:self.DETECT_BYTES], 'strict', final)[0].strip()
+        if final and len(head) < 10:
+            logger.warning("⚠️ No HLA data provided or data too short")
+            return None
+        return self.service._detect_format(head)
+
+    def _scan(self, block: bytes):
+        if self._sorted:
+            # Stop once the last row looked at and this block's first row are both past the region
+            was_past = self._past_region(self._last_key)
+            first = self._edge_key(block, from_end=False)
+            self._see(first)
+            if was_past and self._past_region(first):
+                self.done = True
+                return
+        if self._layout is None:
+            self._layout = _detect_layout(block)
+            if self._layout is None:
+                self._parse_lines(block.decode('utf-8').split('\n'))
+                return
+        starts, ends, positions = _scan_rows(block, *self._layout)
+        if self._sorted and len(positions) and positions.min() < 0:
+            self._take_rows(block, starts, ends, positions)
+            return
+        if self._sorted and len(positions):
+            if (6, int(positions[0])) < self._last_key or (np.diff(positions) < 0).any():
+                self._see((0, 0))
+            else:
+                self._ordered_rows += len(positions)
+                self._last_key = (6, int(positions[-1]))
+        (_, start), (_, end) = self._region
+        wanted = (positions < 0) | ((positions >= start) & (positions <= end))
+        self._parse_lines([block[s:e].decode('utf-8') for s, e in zip(starts[wanted], ends[wanted])])
+        if self._sorted:
+            self._see(self._edge_key(block, from_end=True))
+
+    def _take_rows(self, block: bytes, starts, ends, positions):
+        # Row by row so irregular rows are keyed and order-checked where they sit
+        for s, e, position in zip(starts.tolist(), ends.tolist(), positions.tolist()):
+            line = block[s:e]
+            key = (6, position) if position >= 0 else _row_key(line)
+            self._see(key)
+            if key is None or not self._sorted:
+                self._parse_line(line.decode('utf-8'))
+                continue
+            self._ordered_rows += 1
+            if self._region[0] <= key <= self._region[1]:
+                self._parse_line(line.decode('utf-8'))
+        if self._sorted:
+            self._see(self._edge_key(block, from_end=True))
+
+    def _parse_line(self, line: str):
+        self._parse_lines((line,))
+
+    def _parse_lines(self, lines):
+        parse, append = self.service._parse_csv_line, self.snps.append
+        for line_num, line in enumerate(lines, self.lines + 1):
+            try:
+                snp = parse(line)
+            except Exception as e:
+                # Skip problematic lines without crashing
+                if line_num <= 20:  # Only log first 20 errors to avoid spam
+                    logger.debug(f"⚠️ Line {line_num} parse error: {e}")
+                continue
+            if snp is not None:
+                append(snp)
+        self.lines += len(lines)
+
+    def _past_region(self, key) -> bool:
+        return (self._sorted and self._ordered_rows >= self.MIN_ORDERED_ROWS
+                and key is not None and key > self._region[1])
+
+    def _see(self, key):
+        if key is None or not self._sorted:
+            return
+        if key < self._last_key:
+            logger.info("   DNA file is not sorted by position, scanning all of it")
+            self._sorted = False
+        else:
+            self._last_key = key
+
+    @staticmethod
+    def _edge_key(block: bytes, from_end: bool):
+        """Key of the first (or last) readable row among the block's edge lines."""
+        edge = block[-1024:] if from_end else block[:1024]
+        lines = edge.split(b'\n')
+        if len(block) > len(edge):
+            lines = lines[1:] if from_end else lines[:-1]  # Drop the cut-off line
+        for line in (reversed(lines) if from_end else lines):
+            key = _row_key(line)
+            if key is not None:
+                return key
+        return None
+
+
+def _parse_range(block: bytes, layout) -> tuple:
+    """Worker side of HLAStreamParser.feed_parallel(): (snps, lines parsed) for one range."""
+    parser = HLAStreamParser(HLAService(), fmt='csv')
+    parser._layout, parser._sorted = layout, False
+    parser._scan(block)
+    return parser.snps, parser.lines
@@ -0,0 +1,162 @@
+"""
+Job Service - Background analysis jobs with status polling
+Jobs live in the storage layer, so any worker can answer a status poll and
+queued or interrupted jobs are picked up again after a restart.
+"""
+
+import asyncio
+import logging
+import os
+import socket
+import time
+import traceback
+import uuid
+
+logger = logging.getLogger(__name__)
+
+
+class JobQueue:
+    """
+    Runs submitted jobs on a fixed pool of asyncio workers.
+
+    runner is an async callable (payload, progress) -> result dict, where
+    progress(stage, percent) records how far the job has got.
+
+    A claimed job records the claiming worker_id and a heartbeat that is
+    refreshed while it runs. A periodic sweep re-queues jobs whose heartbeat
+    is older than stale_after (their worker died), and our own 'running' jobs
+    that this process is not running (left over from before a restart).
+    Finished jobs are deleted retention seconds after they end.
+    """
+
+    ACTIVE_STATES = ('queued', 'running')
+    FINISHED_STATES = ('done', 'failed')
+
+    def __init__(self, table, runner, concurrency: int = None, stale_after: int = None,
+                 retention: int = None, worker_id: str = None):
+        self.table = table
+        self.runner = runner
+        self.concurrency = max(1, concurrency or int(os.getenv('ANALYZE_JOB_CONCURRENCY', '2')))
+        # A 'running' job whose heartbeat is this old belongs to a dead worker
+        self.stale_after = stale_after or int(os.getenv('ANALYZE_JOB_STALE_SECONDS', '120'))
+        self.retention = retention or int(os.getenv('ANALYZE_JOB_RETENTION_SECONDS', '86400'))
+        # Stable across restarts of a container (same host name, same pid), so leftovers are ours
+        self.worker_id = worker_id or os.getenv('ANALYZE_JOB_WORKER_ID') or f"{socket.gethostname()}:{os.getpid()}"
+        self.heartbeat = max(1.0, self.stale_after / 4)
+        self._queue = None
+        self._workers = []
+        self._sweeper = None
+        self._running = set()
+        self._enqueued = set()
+
+    async def start(self):
+        """Spawn the worker pool and re-queue jobs left over from a previous run."""
+        self._queue = asyncio.Queue()
+        self._workers = [asyncio.create_task(self._worker(i)) for i in range(self.concurrency)]
+        recovered, pruned = self._sweep(startup=True)
+        self._sweeper = asyncio.create_task(self._sweep_loop())
+        logger.info(f"✅ Job queue: {self.concurrency} workers, {recovered} job(s) recovered, {pruned} pruned")
+
+    async def stop(self):
+        tasks = self._workers + ([self._sweeper] if self._sweeper else [])
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        self._workers = []
+        self._sweeper = None
+
+    def submit(self, payload: dict) -> str:
+        job_id = uuid.uuid4().hex
+        now = time.time()
+        self.table[job_id] = {
+            'job_id': job_id, 'status': 'queued', 'stage': 'queued', 'progress': 0,
+            'payload': payload, 'result': None, 'error': None,
+            'created_at': now, 'updated_at': now
+        }
+        self._enqueue(job_id)
+        return job_id
+
+    def get(self, job_id: str):
+        return self.table.get(job_id)
+
+    def _enqueue(self, job_id: str):
+        self._enqueued.add(job_id)
+        self._queue.put_nowait(job_id)
+
+    async def _sweep_loop(self):
+        while True:
+            await asyncio.sleep(self.heartbeat)
+            try:
+                for job_id in list(self._running):
+                    self._beat(job_id)
+                recovered, pruned = self._sweep()
+                if recovered or pruned:
+                    logger.info(f"♻️  Job sweep: {recovered} job(s) recovered, {pruned} pruned")
+            except Exception as e:
+                logger.error(f"❌ Job sweep failed: {e}")
+
+    def _beat(self, job_id: str):
+        job = self.table.get(job_id)
+        if job and job['status'] == 'running' and job.get('worker') == self.worker_id:
+            self.table.compare_and_set(job_id, job, dict(job, heartbeat_at=time.time()))
+
+    def _sweep(self, startup: bool = False) -> tuple:
+        """Queue abandoned jobs and delete old finished ones; returns (recovered, pruned)."""
+        recovered = pruned = 0
+        now = time.time()
+        for job_id, job in self.table.items():
+            if job['status'] in self.FINISHED_STATES:
+                if now - job['updated_at'] >= self.retention:
+                    self.table.pop(job_id, None)
+                    pruned += 1
+                continue
+            if job['status'] == 'running':
+                mine = job.get('worker') == self.worker_id and job_id not in self._running
+                if not mine and now - job.get('heartbeat_at', job['updated_at']) < self.stale_after:
+                    continue  # Still running on a live worker
+                requeued = dict(job, status='queued', stage='queued', progress=0, worker=None, updated_at=now)
+                if not self.table.compare_and_set(job_id, job, requeued):
+                    continue
+            elif job_id in self._enqueued or (not startup and now - job['updated_at'] < self.stale_after):
+                continue  # Queued here, or (probably) on the worker that accepted it
+            self._enqueue(job_id)
+            recovered += 1
+        return recovered, pruned
+
+    def _update(self, job_id: str, **fields):
+        job = self.table.get(job_id)
+        if job:
+            self.table[job_id] = dict(job, updated_at=time.time(), **fields)
+
+    async def _worker(self, n: int):
+        while True:
+            job_id = await self._queue.get()
+            self._enqueued.discard(job_id)
+            try:
+                job = self.table.get(job_id)
+                if not job or job['status'] != 'queued':
+                    continue
+                # Claim atomically: another worker may have the same id queued
+                now = time.time()
+                running = dict(job, status='running', stage='starting', worker=self.worker_id,
+                               heartbeat_at=now, updated_at=now)
+                if not self.table.compare_and_set(job_id, job, running):
+                    continue
+                self._running.add(job_id)
+
+                async def progress(stage: str, percent: int):
+                    self._update(job_id, stage=stage, progress=percent)
+
+                logger.info(f"⚙️  Job {job_id} started (worker {n})")
+                try:
+                    result = await self.runner(job['payload'], progress)
+                    self._update(job_id, status='done', stage='done', progress=100, result=result)
+                    logger.info(f"✅ Job {job_id} done")
+                except Exception as e:
+                    traceback.print_exc()
+                    self._update(job_id, status='failed', error=str(e) or e.__class__.__name__)
+                    logger.error(f"❌ Job {job_id} failed: {e}")
+                finally:
+                    self._running.discard(job_id)
+            finally:
+                self._queue.task_done()
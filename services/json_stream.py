@@ -0,0 +1,120 @@
+"""
+Incremental JSON - Surface fields of a streamed JSON object as they complete
+Used for streamed Gemini output: each top-level field (and each field of a
+top-level object such as ui_cards) is returned the moment its value closes,
+and whatever completed before a cut-off is kept.
+"""
+
+import json
+
+
+class IncrementalJSONParser:
+    """
+    Feed text chunks of one JSON object; get back newly completed fields.
+
+    Paths are tuples: ('themes',), ('deep_analysis',), ('ui_cards', 'vibe_check').
+    Leading junk such as a ```json fence before the first '{' is ignored.
+    """
+
+    def __init__(self, max_depth: int = 2):
+        self.max_depth = max_depth
+        self.buffer = ''
+        self.result = {}
+        self.complete = False
+        self._pos = 0
+        self._started = False
+        self._stack = []          # frames: [type, key, value_start, expect]
+        self._in_string = False
+        self._escaped = False
+        self._string_start = 0
+
+    def feed(self, chunk: str) -> list:
+        """Append a chunk and return [(path, value), ...] completed by it."""
+        self.buffer += chunk
+        completed = []
+        buf = self.buffer
+        i = self._pos
+
+        while i < len(buf) and not self.complete:
+            c = buf[i]
+
+            if not self._started:
+                if c == '{':
+                    self._started = True
+                    self._stack.append(['obj', None, None, 'key'])
+                i += 1
+                continue
+
+            top = self._stack[-1]
+
+            if self._in_string:
+                if self._escaped:
+                    self._escaped = False
+                elif c == '\\':
+                    self._escaped = True
+                elif c == '"':
+                    self._in_string = False
+                    if top[0] == 'obj' and top[3] == 'key':
+                        top[1] = json.loads(buf[self._string_start:i + 1])
+                    elif top[0] == 'obj':
+                        self._emit(completed, top[1], buf[top[2]:i + 1])
+                        top[2] = None
+                i += 1
+                continue
+
+            if c == '"':
+                self._in_string = True
+                self._string_start = i
+                if top[0] == 'obj' and top[3] == 'value':
+                    top[2] = i
+            elif c in '{[':
+                if top[0] == 'obj' and top[3] == 'value':
+                    top[2] = i
+                self._stack.append(['obj' if c == '{' else 'arr', None, None, 'key' if c == '{' else 'value'])
+            elif c in '}]':
+                self._flush_scalar(completed, top, buf, i)
+                self._stack.pop()
+                if not self._stack:
+                    self.complete = True
+                else:
+                    parent = self._stack[-1]
+                    if parent[0] == 'obj' and parent[2] is not None:
+                        self._emit(completed, parent[1], buf[parent[2]:i + 1])
+                        parent[2] = None
+            elif c == ':':
+                if top[0] == 'obj':
+                    top[3] = 'value'
+            elif c == ',':
+                self._flush_scalar(completed, top, buf, i)
+                if top[0] == 'obj':
+                    top[3] = 'key'
+            elif not c.isspace() and top[0] == 'obj' and top[3] == 'value' and top[2] is None:
+                top[2] = i  # start of a number / true / false / null
+            i += 1
+
+        self._pos = i
+        return completed
+
+    def _flush_scalar(self, completed, top, buf, end):
+        if top[0] == 'obj' and top[3] == 'value' and top[2] is not None:
+            self._emit(completed, top[1], buf[top[2]:end].strip())
+            top[2] = None
+
+    def _emit(self, completed, key, raw):
+        # Only values directly inside objects, no deeper than max_depth
+        if len(self._stack) > self.max_depth or any(frame[0] != 'obj' for frame in self._stack):
+            return
+        try:
+            value = json.loads(raw)
+        except ValueError:
+            return
+        path = tuple(frame[1] for frame in self._stack[:-1]) + (key,)
+        if isinstance(value, dict) and len(path) < self.max_depth:
+            # Its fields were already emitted one by one as they closed
+            self.result.setdefault(key, value)
+            return
+        target = self.result
+        for part in path[:-1]:
+            target = target.setdefault(part, {})
+        target[key] = value
+        completed.append((path, value))
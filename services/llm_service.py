@@ -0,0 +1,90 @@
+"""
+LLM Service - Non-blocking Gemini calls
+The google-generativeai SDK is synchronous, so every model call is pushed onto a
+dedicated, sized thread pool. The event loop stays free while calls are in flight.
+Model handles are cached so repeated calls reuse one configured client connection.
+"""
+
+import asyncio
+import functools
+import json
+import logging
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import google.generativeai as genai
+
+logger = logging.getLogger(__name__)
+
+_executor = None
+
+_models = {}
+_models_lock = threading.Lock()
+_configured_key = None
+
+
+def get_llm_executor() -> ThreadPoolExecutor:
+    """Return the process-wide executor reserved for model calls (created lazily)."""
+    global _executor
+    if _executor is None:
+        max_workers = max(1, int(os.getenv('LLM_MAX_WORKERS', '32')))
+        _executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='gemini')
+        logger.info(f"✅ LLM executor ready ({max_workers} threads)")
+    return _executor
+
+
+async def run_llm_call(fn, *args, **kwargs):
+    """Run a blocking SDK call on the LLM executor and await its result."""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(get_llm_executor(), functools.partial(fn, *args, **kwargs))
+
+
+def shutdown_llm_executor():
+    """Stop the executor; in-flight calls are allowed to finish."""
+    global _executor
+    if _executor is not None:
+        _executor.shutdown(wait=True)
+        _executor = None
+
+
+def configure_genai(api_key: str):
+    """
+    Configure the SDK once per API key.
+
+    genai.configure() throws away the SDK's client (and its open connection),
+    so it is only called again when the key actually changes.
+    """
+    global _configured_key
+    with _models_lock:
+        if api_key == _configured_key:
+            return
+        genai.configure(api_key=api_key)
+        _configured_key = api_key
+        # Cached models hold a client bound to the previous key
+        _models.clear()
+
+
+def _freeze(settings) -> str:
+    return json.dumps(settings, sort_keys=True, default=str) if settings else ''
+
+
+def get_model(model_name: str, generation_config: dict = None, safety_settings: list = None):
+    """Return a cached GenerativeModel for this model name + generation/safety settings."""
+    key = (model_name, _freeze(generation_config), _freeze(safety_settings))
+    model = _models.get(key)
+    if model is None:
+        with _models_lock:
+            model = _models.get(key)
+            if model is None:
+                model = genai.GenerativeModel(model_name, generation_config=generation_config, safety_settings=safety_settings)
+                _models[key] = model
+    return model
+
+
+def clear_model_cache():
+    """Drop every cached model handle (next call re-creates them)."""
+    global _configured_key
+    with _models_lock:
+        _models.clear()
+        _configured_key = None
@@ -0,0 +1,681 @@
+"""
+Match Service - Top-K compatibility search across all stored profiles
+Trait vectors of every profile are held in one NumPy matrix; candidates are
+scored in bulk (or pre-selected with a KD-tree for very large populations)
+and the best ones are re-ranked with the same visual / personality / HLA
+weighting as /api/analyze. Per-user top-K lists are kept up to date in the
+background as profiles change.
+"""
+
+import asyncio
+import heapq
+import logging
+import os
+import socket
+import threading
+import time
+import uuid
+from collections import defaultdict
+
+import numpy as np
+
+try:
+    from scipy.spatial import cKDTree
+except ImportError:  # Optional: brute force is used without scipy
+    cKDTree = None
+
+from services.compute_service import run_compute
+from services.hla_service import HLAPanel, round1
+from services.similarity_service import MAX_DISTANCE, TRAITS, trait_vector, similarity_scores as personality_scores
+from services.storage_service import Table
+
+logger = logging.getLogger(__name__)
+
+# Same weights as /api/analyze
+WEIGHTS = {'visual': 0.50, 'personality': 0.35, 'hla': 0.15}
+NEUTRAL_SCORE = 50.0
+
+
+def overall_scores(visual: np.ndarray, personality: np.ndarray, hla: np.ndarray, plain: np.ndarray) -> np.ndarray:
+    """Weighted overall score, rounded the way /api/analyze rounds it."""
+    raw = visual * WEIGHTS['visual'] + personality * WEIGHTS['personality'] + hla * WEIGHTS['hla']
+    return np.where(plain, round1(raw), np.round(raw, 1))
+
+
+def visual_scores(attr_a, quality_a, attr: np.ndarray, quality: np.ndarray) -> np.ndarray:
+    """VisualService.calculate_mutual_attraction of one person against arrays of others."""
+    base = (attr * 10.0 + attr_a * 10.0) / 2
+    avg_quality = (quality_a / 100 + quality / 100) / 2
+    diff = np.abs(attr_a - attr)
+    bonus = np.where(diff <= 2, 10, np.where(diff <= 4, 5, 0))
+    return round1(np.minimum(100, (base + bonus) * avg_quality))
+
+
+# HLA can move a partial score (computed with the neutral 50) by at most +/- 7.5;
+# two candidates' order can therefore flip within twice that
+HLA_REACH = NEUTRAL_SCORE * WEIGHTS['hla'] * 2
+# Most the rounding of visual, personality and overall can add to an overall score
+ROUNDING_SLACK = 0.1
+
+
+class IndexSnapshot:
+    """
+    One generation of the index: ids, per-profile arrays, the HLA panel and the
+    optional KD-tree. Never modified after construction; MatchIndex publishes a
+    new one with a single reference swap, and readers capture one and use it throughout.
+    """
+
+    def __init__(self, ids, entries, hla_panel: HLAPanel, kdtree_min: int):
+        names, vectors, has_image, attr, quality, has_hla = zip(*entries) if entries else ((),) * 6
+        self.ids = list(ids)
+        self.names = list(names)
+        self.row = {uid: i for i, uid in enumerate(self.ids)}
+        self.matrix = np.vstack(vectors) if vectors else np.empty((0, len(TRAITS)))
+        self.has_image = np.array(has_image, dtype=bool)
+        self.attr = np.array(attr, dtype=np.float64)
+        self.quality = np.array(quality, dtype=np.float64)
+        self.has_hla = np.array(has_hla, dtype=bool)
+        self.hla_panel = hla_panel
+        # Genomes scored pairwise: their HLA score can depend on the direction
+        self.hla_irregular = np.array([uid in hla_panel.irregular for uid in self.ids], dtype=bool)
+        for array in (self.matrix, self.has_image, self.attr, self.quality, self.has_hla, self.hla_irregular):
+            array.flags.writeable = False
+        # Best attractiveness / quality on file: bounds the visual score anyone can reach
+        self.top_attr = float(self.attr[self.has_image].max()) if self.has_image.any() else 0.0
+        self.top_quality = float(self.quality[self.has_image].max()) if self.has_image.any() else 0.0
+
+        # KD-tree only for large, complete populations (NaN rows cannot be indexed)
+        self.tree = None
+        if cKDTree is not None and len(self.ids) >= kdtree_min and not np.isnan(self.matrix).any():
+            self.tree = cKDTree(self.matrix)
+
+    def entry(self, uid: str) -> tuple:
+        i = self.row[uid]
+        return self.names[i], self.matrix[i], self.has_image[i], self.attr[i], self.quality[i], self.has_hla[i]
+
+
+class MatchIndex:
+    """
+    In-process index over PROFILES_DB / IMAGES_DB, rebuilt lazily when marked
+    dirty or older than ttl (so changes made on other workers show up too).
+    """
+
+    def __init__(self, profiles, images, hla_db, hla_service, ttl: float = None,
+                 kdtree_min: int = None, shortlist: int = None):
+        self.profiles = profiles
+        self.images = images
+        self.hla_db = hla_db
+        self.hla_service = hla_service
+        self.ttl = ttl if ttl is not None else float(os.getenv('MATCH_INDEX_TTL', '60'))
+        self.kdtree_min = kdtree_min or int(os.getenv('MATCH_KDTREE_MIN', '100000'))
+        self.shortlist = shortlist or int(os.getenv('MATCH_SHORTLIST', '500'))
+        self._lock = threading.Lock()   # Serializes writers; readers only take self.snapshot
+        self._dirty = True
+        self._built_at = 0.0
+        self.snapshot = IndexSnapshot([], [], HLAPanel(), self.kdtree_min)
+
+    def current(self) -> IndexSnapshot:
+        """The latest snapshot, rebuilt first if it is dirty or stale."""
+        if self._dirty or time.time() - self._built_at >= self.ttl:
+            with self._lock:
+                if self._dirty or time.time() - self._built_at >= self.ttl:
+                    self._build()
+        return self.snapshot
+
+    def _entry(self, uid, profile, features, has_hla):
+        return (profile.get('name', uid), trait_vector(profile.get('sins', {})), features is not None,
+                (features or {}).get('attractiveness', 7), (features or {}).get('quality_score', 70), has_hla)
+
+    def _build(self):
+        started = time.time()
+        self._dirty = False
+        profiles = self.profiles.items()
+        images = dict(self.images.items())
+        hla_panel = HLAPanel(self.hla_db.items())
+
+        ids, entries = [], []
+        for uid, profile in profiles:
+            ids.append(uid)
+            entries.append(self._entry(uid, profile, images.get(uid, {}).get('features'), uid in hla_panel))
+        self.snapshot = snap = IndexSnapshot(ids, entries, hla_panel, self.kdtree_min)
+
+        self._built_at = time.time()
+        logger.info(f"✅ Match index: {len(ids)} profiles in {(self._built_at - started) * 1000:.0f} ms"
+                    f" ({'kdtree' if snap.tree is not None else 'brute force'})")
+
+    def rebuild(self) -> IndexSnapshot:
+        """Re-read every profile now (e.g. after another worker applied changes)."""
+        with self._lock:
+            self._build()
+        return self.snapshot
+
+    def update_users(self, user_ids):
+        """Re-read just these users (new, changed or deleted) instead of rebuilding everything."""
+        if self._dirty or not self._built_at:
+            self.current()
+            return
+        with self._lock:
+            snap = self.snapshot
+            entries = {uid: snap.entry(uid) for uid in snap.ids}
+            hla_panel = snap.hla_panel.copy()
+            for uid in user_ids:
+                profile = self.profiles.get(uid)
+                if profile is None:
+                    entries.pop(uid, None)
+                    hla_panel.update(uid, None)
+                    continue
+                features = (self.images.get(uid) or {}).get('features')
+                hla_panel.update(uid, self.hla_db.get(uid))
+                entries[uid] = self._entry(uid, profile, features, uid in hla_panel)
+            self.snapshot = IndexSnapshot(list(entries), list(entries.values()), hla_panel, self.kdtree_min)
+
+    @staticmethod
+    def _partial_scores(snap: IndexSnapshot, me: int, candidates: np.ndarray):
+        """Visual and personality scores of row me against candidates, plus the overall with neutral HLA."""
+        personality, plain = personality_scores(snap.matrix[me], snap.matrix[candidates])
+        visual = np.full(len(candidates), NEUTRAL_SCORE)
+        if snap.has_image[me]:
+            both = snap.has_image[candidates]
+            visual[both] = visual_scores(snap.attr[me], snap.quality[me], snap.attr[candidates][both], snap.quality[candidates][both])
+        partial = visual * WEIGHTS['visual'] + personality * WEIGHTS['personality'] + NEUTRAL_SCORE * WEIGHTS['hla']
+        return visual, personality, plain, partial
+
+    @staticmethod
+    def _contenders(partial: np.ndarray, k: int) -> np.ndarray:
+        """Positions (best first) that could still reach the top k once their HLA score is in."""
+        if not len(partial):
+            return np.empty(0, dtype=np.int64)
+        order = np.argsort(-partial, kind='stable')
+        kth = partial[order[min(k, len(order)) - 1]]
+        return order[partial[order] >= kth - HLA_REACH]
+
+    def _fill_hla(self, snap: IndexSnapshot, user_id: str, candidates: np.ndarray, positions, hla: np.ndarray):
+        """Exact HLA scores for candidates[positions], in one batch over the genotype panel."""
+        positions = np.asarray(positions, dtype=np.int64)
+        if not len(positions):
+            return
+        ids = [snap.ids[row] for row in candidates[positions]]
+        hla[positions] = self.hla_service.compatibility_one_to_many(snap.hla_panel, user_id, ids)
+
+    def top_matches(self, user_id: str, k: int = 10) -> dict:
+        """Best k partners for user_id, ranked by the weighted overall score."""
+        snap = self.current()
+        if user_id not in snap.row:
+            raise KeyError(user_id)
+        me = snap.row[user_id]
+        n = len(snap.ids)
+
+        # Candidate rows: everyone, or everyone the tree finds close enough to still make the top k
+        if snap.tree is not None:
+            candidates = self._tree_candidates(snap, user_id, k)
+            method = 'kdtree'
+        else:
+            candidates = np.arange(n)
+            method = 'brute_force'
+        candidates = candidates[candidates != me]
+
+        visual, personality, plain, overall, hla = self._scores(snap, user_id, candidates, k)
+        best = np.argsort(-overall, kind='stable')[:k]
+
+        return {
+            'user_id': user_id,
+            'method': method,
+            'population': n,
+            'matches': [self._match(snap, candidates[i], overall[i], visual[i], personality[i], hla[i]) for i in best]
+        }
+
+    def _scores(self, snap: IndexSnapshot, user_id: str, candidates: np.ndarray, k: int) -> tuple:
+        """Scores of user_id against candidates, with exact HLA for everyone who could make the top k."""
+        me = snap.row[user_id]
+        # HLA is only known pairwise: rank with the neutral 50 first, then compute it
+        # for everyone who could still reach the top k once their HLA score is in
+        visual, personality, plain, partial = self._partial_scores(snap, me, candidates)
+        hla = np.full(len(candidates), NEUTRAL_SCORE)
+        if snap.has_hla[me]:
+            self._fill_hla(snap, user_id, candidates, self._contenders(partial, k), hla)
+        return visual, personality, plain, overall_scores(visual, personality, hla, plain), hla
+
+    def _tree_candidates(self, snap: IndexSnapshot, user_id: str, k: int) -> np.ndarray:
+        """
+        Rows (ascending) that can reach user_id's top k, found without scoring everyone.
+
+        The personality-nearest shortlist sets a k-th best overall score. Visual and
+        HLA are bounded by the best on file, so anyone farther away than the radius
+        where even those maxima fall short of it cannot make the top k.
+        """
+        me = snap.row[user_id]
+        n = len(snap.ids)
+        _, rows = snap.tree.query(snap.matrix[me], k=min(n, self.shortlist + 1))
+        rows = np.asarray(rows, dtype=np.int64).ravel()
+        rows = rows[rows != me]
+        if len(rows) < k or len(rows) == n - 1:
+            return np.arange(n)
+        kth = np.sort(self._scores(snap, user_id, rows, k)[3])[-k]
+
+        top_visual = NEUTRAL_SCORE
+        if snap.has_image[me]:
+            best = ((snap.top_attr + snap.attr[me]) * 5 + 10) * (snap.quality[me] + snap.top_quality) / 200
+            top_visual = max(NEUTRAL_SCORE, min(100.0, best))
+        top_hla = 100.0 if snap.has_hla[me] else NEUTRAL_SCORE
+        needed = (kth - ROUNDING_SLACK - top_visual * WEIGHTS['visual'] - top_hla * WEIGHTS['hla']) / WEIGHTS['personality']
+        if needed <= 0:
+            return np.arange(n)  # Even the farthest profile could make it
+        radius = MAX_DISTANCE * (1 - needed / 100) + 1e-9
+        return np.union1d(np.asarray(snap.tree.query_ball_point(snap.matrix[me], radius), dtype=np.int64), rows)
+
+    @staticmethod
+    def _match(snap: IndexSnapshot, row, overall, visual, personality, hla) -> dict:
+        return {
+            'user_id': snap.ids[row],
+            'name': snap.names[row],
+            'overall_score': float(overall),
+            'components': {
+                'visual': {'score': float(visual)},
+                'personality': {'score': float(personality)},
+                'hla': {'score': float(hla)}
+            }
+        }
+
+    def row_scores(self, user_id: str, k: int, floors: np.ndarray = None, forced=(), snap: IndexSnapshot = None) -> dict:
+        """
+        Overall score of user_id against every other profile of snap (default:
+        the current snapshot); candidates are rows of that snapshot.
+
+        HLA is computed only where it can matter: user_id's own top k, candidates
+        whose score may reach floors[row] (e.g. their current k-th best match)
+        and the forced ids. 'exact' marks final scores; the rest use neutral HLA.
+        """
+        snap = snap or self.current()
+        if user_id not in snap.row:
+            raise KeyError(user_id)
+        me = snap.row[user_id]
+        candidates = np.delete(np.arange(len(snap.ids)), me)
+
+        visual, personality, plain, partial = self._partial_scores(snap, me, candidates)
+        hla = np.full(len(candidates), NEUTRAL_SCORE)
+        exact = np.ones(len(candidates), dtype=bool)
+        if snap.has_hla[me]:
+            need = np.zeros(len(candidates), dtype=bool)
+            need[self._contenders(partial, k)] = True
+            if floors is not None:
+                need |= partial + HLA_REACH >= floors[candidates]
+            forced_rows = [snap.row[uid] for uid in forced if uid in snap.row and uid != user_id]
+            need[np.searchsorted(candidates, forced_rows)] = True
+            need &= snap.has_hla[candidates]
+            self._fill_hla(snap, user_id, candidates, np.flatnonzero(need), hla)
+            exact = need | ~snap.has_hla[candidates]
+
+        return {
+            'candidates': candidates,
+            'overall': overall_scores(visual, personality, hla, plain),
+            'visual': visual,
+            'personality': personality,
+            'hla': hla,
+            'plain': plain,
+            'exact': exact
+        }
+
+
+class TopMatchLists:
+    """
+    Per-user bounded top-K partner lists, stored as min-heaps of
+    [overall_score, partner_id, components] in a storage table.
+
+    Changed users are queued with mark_changed() in a pending table every worker
+    shares, and applied in batches by the one worker holding the updater lease
+    (renewed every poll, taken over lease seconds after its holder stops). The
+    changed user's row is rescored, and only partners whose list it enters,
+    leaves or moves in are touched. A list that loses an entry it cannot replace
+    is rescored in full.
+
+    Which lists hold each partner, and each full list's k-th score (its floor),
+    are kept in memory and reloaded from the table whenever another worker has
+    written lists since (the version key changed), so a batch only reads the
+    lists it patches. Patched lists are written with compare_and_set; a list
+    changed underneath is queued again and rescored.
+    """
+
+    def __init__(self, table, index: MatchIndex, k: int = None, batch_delay: float = None,
+                 lease: float = None, worker_id: str = None):
+        self.table = table
+        self.index = index
+        self.k = max(1, k or int(os.getenv('TOP_MATCHES_K', '20')))
+        self.batch_delay = batch_delay if batch_delay is not None else float(os.getenv('TOP_MATCHES_BATCH_DELAY', '2'))
+        self.lease = lease or float(os.getenv('TOP_MATCHES_LEASE_SECONDS', '30'))
+        self.worker_id = worker_id or f"{socket.gethostname()}:{os.getpid()}"
+        # Same backend as the lists, so pending changes and the lease are shared like they are
+        self.pending = Table(table.backend, f"{table.namespace}:pending")
+        self.meta = Table(table.backend, f"{table.namespace}:meta")
+        self._wakeup = None
+        self._task = None
+        self._updater = False              # Whether this worker held the lease at the last poll
+        self._version = None               # Version key the in-memory index below matches
+        self._partners = None              # owner -> partner ids in its list (None: not loaded yet)
+        self._holders = defaultdict(set)   # partner -> owners whose list holds them
+        self._floors = {}                  # owner -> k-th best score of a full list
+        self.batches = 0
+        self.updated = 0
+
+    async def start(self):
+        """Start the updater loop; the first poll tries to take the lease."""
+        self._wakeup = asyncio.Event()
+        self._wakeup.set()
+        self._task = asyncio.create_task(self._run())
+        logger.info(f"✅ Top match lists: k={self.k}, worker {self.worker_id}")
+
+    async def stop(self):
+        if self._task:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+        lease = self.meta.get('updater')
+        if lease and lease['worker'] == self.worker_id:
+            self.meta.compare_and_set('updater', lease, dict(lease, expires=0))  # Let another worker take over now
+        self._updater = False
+
+    def mark_changed(self, user_id: str):
+        self.pending[user_id] = time.time()
+        if self._wakeup:
+            self._wakeup.set()
+
+    def is_pending(self, user_id: str) -> bool:
+        return user_id in self.pending
+
+    async def _run(self):
+        while True:
+            try:
+                # Changes queued on other workers only show up in the pending table
+                await asyncio.wait_for(self._wakeup.wait(), self.lease / 3)
+                await asyncio.sleep(self.batch_delay)  # Let a burst of changes collect into one batch
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+            batch = set()
+            try:
+                if not self._hold_lease():
+                    continue
+                batch = set(self.pending.keys())
+                for user_id in batch:
+                    self.pending.pop(user_id, None)  # Marked again while applying: queued anew
+                if batch:
+                    await run_compute(self.apply, batch)
+            except Exception as e:
+                logger.error(f"❌ Top match update failed for {len(batch)} user(s): {e}")
+
+    def _hold_lease(self) -> bool:
+        """Take or renew the updater lease; on taking it, queue every profile that has no list yet."""
+        now = time.time()
+        lease = self.meta.get('updater')
+        mine = {'worker': self.worker_id, 'expires': now + self.lease}
+        if lease is None:
+            held = self.meta.add('updater', mine)
+        elif lease['worker'] != self.worker_id and lease['expires'] > now:
+            held = False
+        else:
+            held = self.meta.compare_and_set('updater', lease, mine)
+
+        if held and not self._updater:
+            missing = set(self.index.profiles.keys()) - set(self.table.keys())
+            for user_id in missing:
+                self.pending[user_id] = now
+            logger.info(f"✅ Top match lists: {self.worker_id} is the updater, {len(missing)} profile(s) queued")
+        self._updater = held
+        return held
+
+    def get(self, user_id: str, k: int = None):
+        """Best k stored matches for user_id, or None if there is no up-to-date list."""
+        k = k or self.k
+        if k > self.k or self.is_pending(user_id):
+            return None
+        heap = self.table.get(user_id)
+        if heap is None:
+            return None
+        return [
+            {
+                'user_id': partner,
+                'name': (self.index.profiles.get(partner) or {}).get('name', partner),
+                'overall_score': score,
+                'components': {c: {'score': v} for c, v in components.items()}
+            }
+            for score, partner, components in heapq.nlargest(k, heap)
+        ]
+
+    def apply(self, user_ids):
+        """Rescore the changed users and patch the lists they affect."""
+        started = time.time()
+        index = self.index
+        version = self.meta.get('version')
+        if version != self._version or self._partners is None:
+            # Lists (and probably profiles) were written elsewhere: start from the stored state
+            index.rebuild()
+            self._load_index()
+            self._version = version
+        else:
+            index.update_users(user_ids)
+        snap = index.current()  # One generation for the whole batch
+        try:
+            touched, conflicts = self._patch(user_ids, snap)
+        except Exception:
+            self._partners = None  # Lists patched in memory but not written: reload next time
+            raise
+        self._publish(version)
+        if conflicts:
+            self._partners = None
+            for user_id in conflicts:
+                self.pending[user_id] = time.time()  # Picked up by the next poll
+        self.batches += 1
+        self.updated += len(touched)
+        logger.info(f"✅ Top match lists: {len(user_ids)} changed, {len(touched)} list(s) updated"
+                    f" in {(time.time() - started) * 1000:.0f} ms"
+                    + (f", {len(conflicts)} changed elsewhere and queued again" if conflicts else ""))
+
+    def _publish(self, seen):
+        """Move the version key on, so other workers reload their index before their next batch."""
+        token = uuid.uuid4().hex
+        if seen is None:
+            ok = self.meta.add('version', token)
+        else:
+            ok = self.meta.compare_and_set('version', seen, token)
+        if not ok:
+            # Someone else wrote lists during this batch: make both sides reload
+            self.meta['version'] = token
+            self._partners = None
+        self._version = token
+
+    def _patch(self, user_ids, snap: IndexSnapshot) -> tuple:
+        index = self.index
+        heaps = {}  # Lists read (and patched) in this batch
+        read = {}   # ... and their stored value, for compare_and_set
+        floors = np.full(len(snap.ids), -np.inf)
+        for owner, floor in self._floors.items():
+            if owner in snap.row:
+                floors[snap.row[owner]] = floor
+
+        touched, rescore = set(), set()
+        for user_id in user_ids:
+            if user_id not in snap.row:
+                # Deleted profile: drop its list and every entry pointing at it
+                self.table.pop(user_id, None)
+                self._index_list(user_id, [])
+                for owner in list(self._holders.get(user_id, ())):
+                    heap = [e for e in self._heap(heaps, read, owner) if e[1] != user_id]
+                    heapq.heapify(heap)
+                    heaps[owner] = heap
+                    self._index_list(owner, heap)
+                    rescore.add(owner)
+                continue
+
+            scores = index.row_scores(user_id, self.k, floors, forced=self._holders.get(user_id, ()), snap=snap)
+            heaps[user_id] = self._own_heap(scores, snap)
+            self._index_list(user_id, heaps[user_id])
+            touched.add(user_id)
+
+            # A partner's list ranks user_id by the partner's view of the pair. That only
+            # differs in HLA, and only when either genome is scored pairwise (by up to HLA_REACH)
+            me, candidates = snap.row[user_id], scores['candidates']
+            two_way = snap.has_hla[me] & snap.has_hla[candidates] & (snap.hla_irregular[me] | snap.hla_irregular[candidates])
+
+            # Only partners this score can enter, or whose list already holds user_id
+            reach = np.where(two_way, HLA_REACH, 0.0)
+            relevant = np.flatnonzero((scores['exact'] | two_way) & (scores['overall'] + reach >= floors[candidates]))
+            held = [snap.row[p] for p in self._holders.get(user_id, ()) if p in snap.row and p != user_id]
+            relevant = set(relevant.tolist()) | set(np.searchsorted(candidates, held).tolist())
+            for i in relevant:
+                partner = snap.ids[candidates[i]]
+                heap = list(self._heap(heaps, read, partner))  # The memory backend hands out the stored list
+                if two_way[i]:
+                    entry = self._partner_entry(snap, scores, i, partner, user_id)
+                else:
+                    entry = self._entry(scores, i, user_id)
+                if any(e[1] == user_id for e in heap):
+                    # Everyone outside a full list scores <= its old minimum, so the
+                    # new score can stay if it is still at least that; else rescore
+                    floor = heap[0][0]
+                    heap = [e for e in heap if e[1] != user_id]
+                    heapq.heapify(heap)
+                    if len(heap) + 1 >= self.k and entry[0] < floor:
+                        rescore.add(partner)
+                        continue
+                    heapq.heappush(heap, entry)
+                elif len(heap) < self.k:
+                    heapq.heappush(heap, entry)
+                elif entry > heap[0]:
+                    heapq.heapreplace(heap, entry)
+                else:
+                    continue
+                heaps[partner] = heap
+                self._index_list(partner, heap)
+                touched.add(partner)
+                floors[snap.row[partner]] = heap[0][0] if len(heap) >= self.k else -np.inf
+
+        for user_id in rescore:
+            if user_id in snap.row:
+                heaps[user_id] = self._own_heap(index.row_scores(user_id, self.k, snap=snap), snap)
+                self._index_list(user_id, heaps[user_id])
+                touched.add(user_id)
+
+        conflicts = {user_id for user_id in touched if not self._write(user_id, heaps[user_id], read)}
+        return touched - conflicts, conflicts
+
+    def _write(self, owner: str, heap: list, read: dict) -> bool:
+        """Store owner's list; a patched one only if it is still what this batch read."""
+        if owner not in read:
+            self.table[owner] = heap  # Rescored in full from the snapshot
+            return True
+        if read[owner] is None:
+            return self.table.add(owner, heap)
+        return self.table.compare_and_set(owner, read[owner], heap)
+
+    def _load_index(self):
+        """Build the partner -> owners index and the floors from every stored list."""
+        self._partners, self._holders, self._floors = {}, defaultdict(set), {}
+        for owner, heap in self.table.items():
+            self._index_list(owner, heap)
+
+    def _index_list(self, owner: str, heap: list):
+        """Record owner's (new) list in the holders index and floors; [] forgets it."""
+        old = self._partners.pop(owner, set())
+        new = {entry[1] for entry in heap}
+        for partner in old - new:
+            owners = self._holders.get(partner)
+            if owners is not None:
+                owners.discard(owner)
+                if not owners:
+                    del self._holders[partner]
+        for partner in new - old:
+            self._holders[partner].add(owner)
+        if new:
+            self._partners[owner] = new
+        if len(heap) >= self.k:
+            self._floors[owner] = heap[0][0]
+        else:
+            self._floors.pop(owner, None)
+
+    def _heap(self, heaps: dict, read: dict, owner: str) -> list:
+        """owner's list as patched so far in this batch, read from the table on first use."""
+        if owner not in heaps:
+            read[owner] = self.table.get(owner)
+            heaps[owner] = read[owner] or []
+        return heaps[owner]
+
+    def _entry(self, scores: dict, i: int, partner_id: str) -> list:
+        return [float(scores['overall'][i]), partner_id, {
+            'visual': float(scores['visual'][i]),
+            'personality': float(scores['personality'][i]),
+            'hla': float(scores['hla'][i])
+        }]
+
+    def _partner_entry(self, snap: IndexSnapshot, scores: dict, i: int, partner_id: str, user_id: str) -> list:
+        """user_id's entry in partner_id's list, with HLA scored from the partner's side."""
+        hla = self.index.hla_service.compatibility_one_to_many(snap.hla_panel, partner_id, [user_id])
+        pick = slice(i, i + 1)
+        overall = overall_scores(scores['visual'][pick], scores['personality'][pick], hla, scores['plain'][pick])
+        return [float(overall[0]), user_id, {
+            'visual': float(scores['visual'][i]),
+            'personality': float(scores['personality'][i]),
+            'hla': float(hla[0])
+        }]
+
+    def _own_heap(self, scores: dict, snap: IndexSnapshot) -> list:
+        """Heap of the k best exactly scored candidates in a row_scores() result."""
+        exact = np.flatnonzero(scores['exact'])
+        best = exact[np.argsort(-scores['overall'][exact], kind='stable')[:self.k]]
+        heap = [self._entry(scores, i, snap.ids[scores['candidates'][i]]) for i in best]
+        heapq.heapify(heap)
+        return heap
+
+    def stats(self) -> dict:
+        return {'k': self.k, 'pending': len(self.pending), 'updater': self._updater,
+                'batches': self.batches, 'lists_updated': self.updated}
+
+
+def compatibility_matrix(user_ids: list, profiles, images, hla_db, hla_service, block_size: int = 512) -> dict:
+    """
+    All-pairs visual / personality / HLA / overall scores for a cohort.
+
+    Scores are computed block by block (block_size x block_size), so working
+    memory beyond the N x N results stays bounded. Visual and personality are
+    symmetric and come from the upper triangle; HLA is scored in both directions
+    from one shared HLAPanel. Diagonal entries are NaN. Entry [i][j] equals the /api/analyze
+    components for user_a = user_ids[i], user_b = user_ids[j].
+    """
+    n = len(user_ids)
+    block_size = max(1, block_size)
+    matrix = np.vstack([trait_vector(profiles[uid].get('sins', {})) for uid in user_ids]) if n else np.empty((0, len(TRAITS)))
+    features = [(images.get(uid) or {}).get('features') for uid in user_ids]
+    has_image = np.array([f is not None for f in features], dtype=bool)
+    attr = np.array([(f or {}).get('attractiveness', 7) for f in features], dtype=np.float64)
+    quality = np.array([(f or {}).get('quality_score', 70) for f in features], dtype=np.float64)
+
+    panel = HLAPanel((uid, hla_db.get(uid)) for uid in user_ids)
+
+    visual = np.full((n, n), NEUTRAL_SCORE)
+    personality = np.empty((n, n))
+    plain = np.zeros((n, n), dtype=bool)
+    hla = np.full((n, n), NEUTRAL_SCORE)
+
+    for start_a in range(0, n, block_size):
+        rows = np.arange(start_a, min(start_a + block_size, n))
+        for start_b in range(start_a, n, block_size):
+            cols = np.arange(start_b, min(start_b + block_size, n))
+
+            block = np.ix_(rows, cols)
+            personality[block], plain[block] = personality_scores(matrix[rows, None, :], matrix[None, cols, :])
+
+            both = has_image[rows, None] & has_image[None, cols]
+            scores = visual_scores(attr[rows, None], quality[rows, None], attr[None, cols], quality[None, cols])
+            visual[block] = np.where(both, scores, NEUTRAL_SCORE)
+
+            row_ids, col_ids = [user_ids[i] for i in rows], [user_ids[j] for j in cols]
+            hla[block] = hla_service.compatibility_block(panel, row_ids, col_ids)
+            if start_b != start_a:
+                hla[np.ix_(cols, rows)] = hla_service.compatibility_block(panel, col_ids, row_ids)
+
+    upper = np.triu_indices(n, 1)
+    for component in (visual, personality, plain):
+        component[(upper[1], upper[0])] = component[upper]
+
+    overall = overall_scores(visual, personality, hla, plain)
+    for component in (visual, personality, hla, overall):
+        np.fill_diagonal(component, np.nan)
+    return {'user_ids': list(user_ids), 'visual': visual, 'personality': personality, 'hla': hla, 'overall': overall}
@@ -16,6 +16,9 @@ logger = logging.getLogger(__name__)
 class ReportService:
     """Generate comprehensive 25-30 page Word reports with maximum detail."""
 
+    # Bump when the report layout changes so memoized reports are rebuilt
+    REPORT_VERSION = 1
+
     TRAIT_ORDER = ["drive", "confidence", "passion", "assertiveness", "indulgence", "aspiration", "ease"]
 
     # Map neutral trait keys to original sin names for report display
@@ -0,0 +1,164 @@
+"""
+Response Pool Service - Pre-generated answers for /api/generate-response
+The Felix question set is fixed and there are only three tones, so several
+candidate answers per (question id, tone) are generated ahead of time and
+served from the store. Each served candidate is replaced in the background.
+"""
+
+import asyncio
+import json
+import logging
+import random
+import re
+import time
+from contextlib import nullcontext
+
+logger = logging.getLogger(__name__)
+
+
+class ResponsePool:
+    """
+    Candidate answers keyed by "question_id|tone" in a storage table.
+
+    generator is an async callable (question, tone) -> candidate or None (the live
+    model); a candidate is any JSON-safe answer, e.g. {"response", "model_used"}.
+
+    A failed refill (generator returned None or raised) pauses every refill,
+    for RETRY_AFTER seconds doubling up to MAX_RETRY_AFTER, so a model outage
+    doesn't add a background call to every live request.
+    """
+
+    TONES = ('positive', 'negative', 'neutral')
+    RETRY_AFTER = 30
+    MAX_RETRY_AFTER = 900
+
+    def __init__(self, table, generator, questions_path: str, per_key: int = 3, concurrency: int = 4):
+        self.table = table
+        self.generator = generator
+        self.per_key = max(1, per_key)
+        self.concurrency = max(1, concurrency)
+        self.questions = self._load_questions(questions_path)
+        self._by_text = {self._normalize(q): qid for qid, q in self.questions.items()}
+        self._refilling = set()
+        self._tasks = set()
+        self._failures = 0
+        self._paused_until = 0.0
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def _normalize(text: str) -> str:
+        return re.sub(r'\s+', ' ', (text or '').strip().lower())
+
+    @staticmethod
+    def _load_questions(path: str) -> dict:
+        try:
+            with open(path, encoding='utf-8') as f:
+                data = json.load(f)
+            return {q['id']: q['question'] for block in data['questions'].values() for q in block}
+        except Exception as e:
+            logger.warning(f"⚠️  Response pool: could not load questions from {path}: {e}")
+            return {}
+
+    def _key(self, question_id: str, tone: str) -> str:
+        return f"{question_id}|{tone}"
+
+    def take(self, question: str, tone: str):
+        """Pop one pooled candidate for this question text + tone (None if empty/unknown)."""
+        qid = self._by_text.get(self._normalize(question))
+        if qid is None or tone not in self.TONES:
+            return None
+        key = self._key(qid, tone)
+
+        taken = None
+        for _ in range(5):  # Retry if another worker took a candidate concurrently
+            candidates = self.table.get(key) or []
+            if not candidates:
+                break
+            pick = random.randrange(len(candidates))
+            remaining = candidates[:pick] + candidates[pick + 1:]
+            if self.table.compare_and_set(key, candidates, remaining):
+                taken = candidates[pick]
+                break
+
+        if taken is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+        self.schedule_refill(qid, tone)
+        return taken
+
+    def paused(self) -> bool:
+        return time.time() < self._paused_until
+
+    def schedule_refill(self, question_id: str, tone: str):
+        """Top the key back up to per_key in the background (once at a time per key, not while paused)."""
+        key = self._key(question_id, tone)
+        if key in self._refilling or self.paused():
+            return
+        self._refilling.add(key)
+        task = asyncio.create_task(self._refill(question_id, tone))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def _refill(self, question_id: str, tone: str, sem: asyncio.Semaphore = None):
+        key = self._key(question_id, tone)
+        try:
+            while len(self.table.get(key) or []) < self.per_key:
+                async with sem or nullcontext():
+                    if self.paused():  # Another refill just failed (checked after waiting for sem)
+                        break
+                    candidate = await self.generator(self.questions[question_id], tone)
+                if not candidate:
+                    self._pause(key)  # Model unavailable: the live path keeps serving meanwhile
+                    break
+                self._failures = 0
+                self._append(key, candidate)
+        except Exception as e:
+            logger.warning(f"⚠️  Response pool refill failed for {key}: {e}")
+            self._pause(key)
+        finally:
+            self._refilling.discard(key)
+
+    def _pause(self, key: str):
+        self._failures += 1
+        delay = min(self.MAX_RETRY_AFTER, self.RETRY_AFTER * 2 ** (self._failures - 1))
+        self._paused_until = time.time() + delay
+        logger.warning(f"⚠️  Response pool refill for {key} got no answer, pausing refills for {delay}s")
+
+    def _append(self, key: str, candidate):
+        for _ in range(5):
+            candidates = self.table.get(key)
+            if candidates is None:
+                self.table[key] = [candidate]
+                return
+            if len(candidates) >= self.per_key or self.table.compare_and_set(key, candidates, candidates + [candidate]):
+                return
+
+    async def warm(self):
+        """Fill every (question, tone) key up to per_key, concurrency-limited."""
+        sem = asyncio.Semaphore(self.concurrency)
+        jobs = []
+        for qid in self.questions:
+            for tone in self.TONES:
+                key = self._key(qid, tone)
+                if key in self._refilling or len(self.table.get(key) or []) >= self.per_key:
+                    continue
+                self._refilling.add(key)
+                jobs.append(self._refill(qid, tone, sem))
+        logger.info(f"🔥 Warming response pool: {len(jobs)} keys")
+        await asyncio.gather(*jobs)
+        logger.info(f"✅ Response pool warm ({self.size()} answers)")
+
+    def size(self) -> int:
+        return sum(len(self.table.get(self._key(q, t)) or []) for q in self.questions for t in self.TONES)
+
+    def stats(self) -> dict:
+        return {
+            'questions': len(self.questions),
+            'per_key': self.per_key,
+            'pooled': self.size(),
+            'hits': self.hits,
+            'misses': self.misses,
+            'refills_paused_for': max(0, round(self._paused_until - time.time()))
+        }
@@ -1,47 +1,101 @@
 """
 Similarity Service - Calculate personality similarity between profiles
+Profiles are compared as trait vectors in a fixed trait order, one against
+many or many against many, with plain NumPy array operations.
 """
 
 import numpy as np
 
+TRAITS = ["drive", "confidence", "passion", "assertiveness", "indulgence", "aspiration", "ease"]
+
+# Max distance for traits is ~14 (if all traits differ by 5 or -5)
+MAX_DISTANCE = 14.0
+DEFAULT_SIMILARITY = 50.0
+
+
+def trait_vector(profile: dict) -> np.ndarray:
+    """Trait scores in TRAITS order; NaN where a trait is missing."""
+    return np.array([profile[t]['score'] if t in profile else np.nan for t in TRAITS], dtype=np.float64)
+
+
+def similarity_scores(vec: np.ndarray, matrix: np.ndarray):
+    """
+    Similarity (0-100) of vec against every row of matrix; any shapes that
+    broadcast over the last (trait) axis work. Traits missing on either side
+    are skipped, and pairs sharing no trait get DEFAULT_SIMILARITY.
+
+    Returns (scores, plain). plain marks the pairs where the pairwise method
+    has always returned a Python float instead of np.float64 (no shared traits,
+    or distance past MAX_DISTANCE). That decides how callers' round() behaves
+    on sums that include the score.
+    """
+    sq = (matrix - vec) ** 2
+    missing = np.isnan(sq)
+    sq[missing] = 0.0
+    ratio = np.sqrt(sq.sum(axis=-1)) / MAX_DISTANCE
+    none_shared = missing.all(axis=-1)
+    scores = np.round(100 * (1 - np.minimum(ratio, 1.0)), 1)
+    scores[none_shared] = DEFAULT_SIMILARITY
+    return scores, (ratio > 1.0) | none_shared
+
+
 class SimilarityService:
     """Service for calculating personality similarity and compatibility."""
-    
+
+    TRAITS = TRAITS
+
     def __init__(self):
         """Initialize the similarity service."""
         pass
-    
-    def calculate_perceived_similarity(self, profile_a: dict, profile_b: dict) -> float:
+
+    def trait_matrix(self, profiles: list) -> np.ndarray:
+        """Stack trait profiles into an (N, 7) matrix in TRAITS order."""
+        if not profiles:
+            return np.empty((0, len(TRAITS)))
+        return np.vstack([trait_vector(p) for p in profiles])
+
+    def similarity_one_to_many(self, vec: np.ndarray, matrix: np.ndarray) -> np.ndarray:
         """
-        Calculate perceived similarity between two personality profiles.
+        Similarity of one trait vector against each row of a trait matrix.
 
         Args:
-            profile_a: First person's traits profile
-            profile_b: Second person's traits profile
+            vec: (7,) trait vector
+            matrix: (N, 7) trait matrix
 
         Returns:
-            Similarity score (0-100)
+            (N,) similarity scores (0-100)
         """
-        # Extract trait scores
-        traits = ["drive", "confidence", "passion", "assertiveness", "indulgence", "aspiration", "ease"]
+        return similarity_scores(np.asarray(vec, dtype=np.float64), np.asarray(matrix, dtype=np.float64))[0]
 
-        scores_a = []
-        scores_b = []
+    def similarity_many_to_many(self, matrix_a: np.ndarray, matrix_b: np.ndarray, block_size: int = 1024) -> np.ndarray:
+        """
+        Similarity of every row of matrix_a against every row of matrix_b.
 
-        for trait in traits:
-            if trait in profile_a and trait in profile_b:
-                scores_a.append(profile_a[trait]['score'])
-                scores_b.append(profile_b[trait]['score'])
+        Rows of matrix_a are processed block_size at a time to bound memory.
 
-        if not scores_a:
-            return 50.0  # Default if no data
+        Returns:
+            (len(matrix_a), len(matrix_b)) similarity scores (0-100)
+        """
+        matrix_a = np.asarray(matrix_a, dtype=np.float64)
+        matrix_b = np.asarray(matrix_b, dtype=np.float64)
+        block_size = max(1, block_size)
+        result = np.empty((len(matrix_a), len(matrix_b)))
+        for start in range(0, len(matrix_a), block_size):
+            block = matrix_a[start:start + block_size]
+            result[start:start + len(block)] = similarity_scores(block[:, None, :], matrix_b[None, :, :])[0]
+        return result
 
-        # Calculate Euclidean distance
-        distance = np.sqrt(sum((a - b) ** 2 for a, b in zip(scores_a, scores_b)))
+    def calculate_perceived_similarity(self, profile_a: dict, profile_b: dict) -> float:
+        """
+        Calculate perceived similarity between two personality profiles.
 
-        # Normalize to 0-100 scale (lower distance = higher similarity)
-        # Max distance for traits is ~14 (if all traits differ by 5 or -5)
-        max_distance = 14.0
-        similarity = 100 * (1 - min(distance / max_distance, 1.0))
+        Args:
+            profile_a: First person's traits profile
+            profile_b: Second person's traits profile
 
-        return round(similarity, 1)
+        Returns:
+            Similarity score (0-100)
+        """
+        scores, plain = similarity_scores(trait_vector(profile_a), trait_vector(profile_b)[None, :])
+        # Same return types as before: Python float for the default/capped cases
+        return float(scores[0]) if plain[0] else scores[0]
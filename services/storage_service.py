@@ -0,0 +1,252 @@
+"""
+Storage Service - Shared state for profiles, images, HLA data and reports
+Pluggable backends: in-memory (default, single process) and SQLite in WAL mode,
+which every gunicorn worker and every restart sees.
+"""
+
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+from collections.abc import MutableMapping
+
+logger = logging.getLogger(__name__)
+
+_MISSING = object()
+
+
+class MemoryBackend:
+    """Process-local dicts (the original behaviour). Not shared between workers."""
+
+    name = 'memory'
+
+    def __init__(self):
+        self._data = {}
+        self._updated = {}   # namespace -> key -> last write time
+        self._lock = threading.Lock()
+
+    def get(self, namespace: str, key: str, default=_MISSING):
+        return self._data.get(namespace, {}).get(key, default)
+
+    def exists(self, namespace: str, key: str) -> bool:
+        return key in self._data.get(namespace, {})
+
+    def put(self, namespace: str, key: str, value):
+        with self._lock:
+            self._data.setdefault(namespace, {})[key] = value
+            self._updated.setdefault(namespace, {})[key] = time.time()
+
+    def delete(self, namespace: str, key: str) -> bool:
+        with self._lock:
+            self._updated.get(namespace, {}).pop(key, None)
+            return self._data.get(namespace, {}).pop(key, _MISSING) is not _MISSING
+
+    def add(self, namespace: str, key: str, value) -> bool:
+        with self._lock:
+            table = self._data.setdefault(namespace, {})
+            if key in table:
+                return False
+            table[key] = value
+            self._updated.setdefault(namespace, {})[key] = time.time()
+            return True
+
+    def compare_and_set(self, namespace: str, key: str, expected, value) -> bool:
+        with self._lock:
+            table = self._data.setdefault(namespace, {})
+            if table.get(key, _MISSING) != expected:
+                return False
+            table[key] = value
+            self._updated.setdefault(namespace, {})[key] = time.time()
+            return True
+
+    def delete_older_than(self, namespace: str, cutoff: float) -> int:
+        with self._lock:
+            updated = self._updated.get(namespace, {})
+            old = [key for key, at in updated.items() if at < cutoff]
+            for key in old:
+                del updated[key]
+                self._data[namespace].pop(key, None)
+            return len(old)
+
+    def keys(self, namespace: str) -> list:
+        return list(self._data.get(namespace, {}).keys())
+
+    def items(self, namespace: str) -> list:
+        return list(self._data.get(namespace, {}).items())
+
+    def count(self, namespace: str) -> int:
+        return len(self._data.get(namespace, {}))
+
+
+class SQLiteBackend:
+    """
+    Embedded SQLite store, one row per (namespace, key) holding a JSON value.
+    WAL mode lets many workers read while one writes; the composite primary key
+    is the lookup index.
+    """
+
+    name = 'sqlite'
+
+    def __init__(self, path: str):
+        self.path = path
+        directory = os.path.dirname(os.path.abspath(path))
+        os.makedirs(directory, exist_ok=True)
+        self._local = threading.local()
+
+        conn = self._conn()
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("""
+            CREATE TABLE IF NOT EXISTS kv (
+                namespace TEXT NOT NULL,
+                key TEXT NOT NULL,
+                value TEXT NOT NULL,
+                updated_at REAL NOT NULL,
+                PRIMARY KEY (namespace, key)
+            ) WITHOUT ROWID
+        """)
+        conn.execute("CREATE INDEX IF NOT EXISTS kv_updated ON kv (namespace, updated_at)")
+        conn.commit()
+        logger.info(f"✅ SQLite storage ready: {path}")
+
+    def _conn(self) -> sqlite3.Connection:
+        # sqlite3 connections are not shareable across threads: one per thread
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30)
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute("PRAGMA busy_timeout=30000")
+            self._local.conn = conn
+        return conn
+
+    def get(self, namespace: str, key: str, default=_MISSING):
+        row = self._conn().execute(
+            "SELECT value FROM kv WHERE namespace = ? AND key = ?", (namespace, key)
+        ).fetchone()
+        return json.loads(row[0]) if row else default
+
+    def exists(self, namespace: str, key: str) -> bool:
+        # Membership tests skip fetching and decoding the value
+        row = self._conn().execute(
+            "SELECT 1 FROM kv WHERE namespace = ? AND key = ? LIMIT 1", (namespace, key)
+        ).fetchone()
+        return row is not None
+
+    def put(self, namespace: str, key: str, value):
+        conn = self._conn()
+        conn.execute(
+            "INSERT INTO kv (namespace, key, value, updated_at) VALUES (?, ?, ?, ?) "
+            "ON CONFLICT (namespace, key) DO UPDATE SET value = excluded.value, updated_at = excluded.updated_at",
+            (namespace, key, json.dumps(value), time.time())
+        )
+        conn.commit()
+
+    def delete(self, namespace: str, key: str) -> bool:
+        conn = self._conn()
+        cur = conn.execute("DELETE FROM kv WHERE namespace = ? AND key = ?", (namespace, key))
+        conn.commit()
+        return cur.rowcount > 0
+
+    def add(self, namespace: str, key: str, value) -> bool:
+        conn = self._conn()
+        cur = conn.execute(
+            "INSERT INTO kv (namespace, key, value, updated_at) VALUES (?, ?, ?, ?) ON CONFLICT (namespace, key) DO NOTHING",
+            (namespace, key, json.dumps(value), time.time())
+        )
+        conn.commit()
+        return cur.rowcount > 0
+
+    def compare_and_set(self, namespace: str, key: str, expected, value) -> bool:
+        conn = self._conn()
+        cur = conn.execute(
+            "UPDATE kv SET value = ?, updated_at = ? WHERE namespace = ? AND key = ? AND value = ?",
+            (json.dumps(value), time.time(), namespace, key, json.dumps(expected))
+        )
+        conn.commit()
+        return cur.rowcount > 0
+
+    def delete_older_than(self, namespace: str, cutoff: float) -> int:
+        # Range scan on the kv_updated index
+        conn = self._conn()
+        cur = conn.execute("DELETE FROM kv WHERE namespace = ? AND updated_at < ?", (namespace, cutoff))
+        conn.commit()
+        return cur.rowcount
+
+    def keys(self, namespace: str) -> list:
+        rows = self._conn().execute("SELECT key FROM kv WHERE namespace = ?", (namespace,)).fetchall()
+        return [r[0] for r in rows]
+
+    def items(self, namespace: str) -> list:
+        rows = self._conn().execute("SELECT key, value FROM kv WHERE namespace = ?", (namespace,)).fetchall()
+        return [(k, json.loads(v)) for k, v in rows]
+
+    def count(self, namespace: str) -> int:
+        return self._conn().execute("SELECT COUNT(*) FROM kv WHERE namespace = ?", (namespace,)).fetchone()[0]
+
+
+class Table(MutableMapping):
+    """Dict-like view of one namespace, so callers keep using db[key] / key in db."""
+
+    def __init__(self, backend, namespace: str):
+        self.backend = backend
+        self.namespace = namespace
+
+    def __getitem__(self, key):
+        value = self.backend.get(self.namespace, key)
+        if value is _MISSING:
+            raise KeyError(key)
+        return value
+
+    def __setitem__(self, key, value):
+        self.backend.put(self.namespace, key, value)
+
+    def __delitem__(self, key):
+        if not self.backend.delete(self.namespace, key):
+            raise KeyError(key)
+
+    def add(self, key, value) -> bool:
+        """Store value only if key is not there yet (atomic across workers)."""
+        return self.backend.add(self.namespace, key, value)
+
+    def compare_and_set(self, key, expected, value) -> bool:
+        """Store value only if the current value still equals expected (atomic across workers)."""
+        return self.backend.compare_and_set(self.namespace, key, expected, value)
+
+    def purge_older_than(self, seconds: float) -> int:
+        """Delete every entry last written more than seconds ago; returns how many."""
+        return self.backend.delete_older_than(self.namespace, time.time() - seconds)
+
+    def __contains__(self, key):
+        return self.backend.exists(self.namespace, key)
+
+    def __iter__(self):
+        return iter(self.backend.keys(self.namespace))
+
+    def items(self):
+        """All (key, value) pairs in one backend round-trip (bulk loads, index builds)."""
+        return self.backend.items(self.namespace)
+
+    def __len__(self):
+        return self.backend.count(self.namespace)
+
+
+class Storage:
+    """Entry point: pick a backend once, then hand out per-namespace tables."""
+
+    def __init__(self, backend):
+        self.backend = backend
+
+    def table(self, namespace: str) -> Table:
+        return Table(self.backend, namespace)
+
+
+def create_storage(backend: str = None, path: str = None) -> Storage:
+    """Build storage from arguments or STORAGE_BACKEND / STORAGE_PATH."""
+    backend = (backend or os.getenv('STORAGE_BACKEND', 'memory')).lower()
+    if backend == 'sqlite':
+        return Storage(SQLiteBackend(path or os.getenv('STORAGE_PATH', './storage/harmonia.db')))
+    if backend != 'memory':
+        logger.warning(f"⚠️  Unknown STORAGE_BACKEND '{backend}', using memory")
+    logger.info("✅ In-memory storage (single worker only)")
+    return Storage(MemoryBackend())
@@ -3,18 +3,19 @@ Visual Service - NO thinking_budget (OLD SDK)
 Maximized with temp/tokens/top_p instead!
 """
 
-import google.generativeai as genai
 import logging
 from PIL import Image
 import io
 
+from services.llm_service import run_llm_call, configure_genai, get_model
+
 logger = logging.getLogger(__name__)
 
 class VisualService:
 
     def __init__(self, api_key: str, model_name: str = None):
         import os
-        genai.configure(api_key=api_key)
+        configure_genai(api_key)
         # Use model from parameter, environment, or default to Gemini 3 Flash (fast with Pro reasoning)
         self.model_name = model_name or os.getenv('GEMINI_MODEL', 'gemini-3-flash-preview')
 
@@ -36,12 +37,12 @@ class VisualService:
         for model_name in models_to_try:
             try:
                 logger.info(f"🔮 Trying {model_name}...")
-                model = genai.GenerativeModel(model_name)
+                model = get_model(model_name, generation_config, self.safety_settings)
 
                 if image:
-                    response = model.generate_content([prompt, image], generation_config=generation_config, safety_settings=self.safety_settings)
+                    response = model.generate_content([prompt, image])
                 else:
-                    response = model.generate_content(prompt, generation_config=generation_config, safety_settings=self.safety_settings)
+                    response = model.generate_content(prompt)
 
                 text = self._extract_text_safely(response)
                 if text:
@@ -135,6 +136,10 @@ class VisualService:
             logger.error(f"❌ {e}")
             return {'quality_score': 70, 'attractiveness': 7, 'expression': 'neutral', 'impression': 'friendly', 'confidence': 0.5}
     
+    async def extract_features_async(self, image_bytes: bytes) -> dict:
+        """Non-blocking extract_features: the model call runs on the shared LLM executor."""
+        return await run_llm_call(self.extract_features, image_bytes)
+
     def calculate_mutual_attraction(self, features_a: dict, features_b: dict) -> dict:
         try:
             attr_a = features_a.get('attractiveness', 7)
@@ -0,0 +1,53 @@
+"""Random HLA genomes in every shape HLA_DB holds, for the scoring parity tests."""
+import random
+
+from services.hla_service import HLAService
+
+GENOTYPES = ['AA', 'AG', 'GG', 'CT', 'CC', 'TT', '--', 'A']
+KINDS = ['packed'] * 8 + ['duplicate', 'moved', 'manual', 'list', 'none']
+
+
+def random_sites(rng: random.Random, n: int = 300) -> list:
+    """(rsid, position, locus) sites in the HLA region, as a parser would label them."""
+    service = HLAService()
+    sites = {}
+    for _ in range(n):
+        position = rng.randrange(service.HLA_REGION_START, service.HLA_REGION_END)
+        if rng.random() < 0.6:
+            start, end = rng.choice(list(service.LOCUS_RANGES.values()))
+            position = rng.randrange(start, end + 1)
+        sites[f"rs{rng.randrange(1, 10 ** 7)}"] = (position, service._position_to_locus(position))
+    return [(rsid, position, locus) for rsid, (position, locus) in sites.items()]
+
+
+def random_genome(rng: random.Random, sites: list, kind: str):
+    """
+    One stored genome: packed array, packed with a duplicate rsid, packed with
+    some rsids at other positions / loci, manual alleles or an uncompressed list.
+    """
+    if kind == 'manual':
+        loci = rng.sample(['A', 'B', 'C', 'DRB1'], rng.randrange(1, 4))
+        return {'manual_alleles': {locus: [f"{rng.randrange(1, 4):02d}:{rng.randrange(1, 3):02d}" for _ in range(2)]
+                                   for locus in loci}}
+    snps = [{'rsid': rsid, 'position': position, 'genotype': rng.choice(GENOTYPES), 'locus': locus}
+            for rsid, position, locus in rng.sample(sites, rng.randrange(1, min(len(sites), 120)))]
+    if kind == 'duplicate':
+        snps.append(dict(rng.choice(snps), genotype=rng.choice(['AA', 'GG'])))
+    if kind == 'moved':
+        for snp in rng.sample(snps, max(1, len(snps) // 10)):
+            snp['position'] += 1
+            snp['locus'] = rng.choice(['HLA-OTHER', 'HLA-A', 'HLA-DQB1'])
+    rng.shuffle(snps)
+    return snps if kind == 'list' else HLAService().to_storage(snps)
+
+
+def random_hla_db(seed: int, user_ids: list) -> dict:
+    """HLA_DB-style dict for some of user_ids, mixing every kind of genome."""
+    rng = random.Random(seed)
+    sites = random_sites(rng)
+    db = {}
+    for user_id in user_ids:
+        kind = rng.choice(KINDS)
+        if kind != 'none':
+            db[user_id] = random_genome(rng, sites, kind)
+    return db
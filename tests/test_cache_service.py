@@ -0,0 +1,28 @@
+import time
+
+import pytest
+
+from services.cache_service import ResultCache
+from services.storage_service import create_storage
+
+
+@pytest.mark.parametrize('backend', ['memory', 'sqlite'])
+def test_set_purges_expired_disk_entries(backend, tmp_path):
+    disk = create_storage(backend, str(tmp_path / 'cache.db')).table('cache')
+    cache = ResultCache('test', ttl=0.2, disk_table=disk, purge_interval=0)
+    cache.set('old', 1)
+    time.sleep(0.3)
+    cache.set('new', 2)
+
+    assert 'old' not in disk and disk['new']['value'] == 2
+    assert cache.stats()['disk_purged'] == 1
+
+
+def test_purge_runs_at_most_once_per_interval(tmp_path):
+    disk = create_storage('sqlite', str(tmp_path / 'cache.db')).table('cache')
+    cache = ResultCache('test', ttl=0.1, disk_table=disk, purge_interval=3600)
+    cache.set('a', 1)
+    time.sleep(0.2)
+    cache.set('b', 2)
+
+    assert 'a' in disk
@@ -0,0 +1,136 @@
+"""
+The streaming DNA parser against the original line-by-line parser, on a
+fuzzed corpus of sorted, shuffled and malformed raw-data files.
+"""
+import gzip
+import io
+import random
+import zipfile
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from services.hla_service import HLAService, dna_file_chunks
+
+SERVICE = HLAService()
+ODD_WHITESPACE = ['', ' ', '\t', '\x0b', '\x1c', '\xa0', '\r', '  ']
+
+
+def line_parse(text: str) -> list:
+    """What _parse_csv_format did before streaming: decode all, split, parse each line."""
+    snps = []
+    for line in text.strip().split('\n'):
+        snp = SERVICE._parse_csv_line(line)
+        if snp is not None:
+            snps.append(snp)
+    return snps
+
+
+def stream_parse(data: bytes, rng: random.Random) -> list:
+    parser = SERVICE.stream_parser()
+    parser.BLOCK_BYTES = rng.choice([1, 100, 65536])
+    parser.MIN_ORDERED_ROWS = rng.choice([50, 1000])
+    i = 0
+    while i < len(data) and not parser.done:
+        size = rng.choice([1, 7, 500, 4096, 1 << 16])
+        parser.feed(data[i:i + size])
+        i += size
+    return parser.close()
+
+
+def odd_line(rng: random.Random, delimiter: str) -> str:
+    """A row that is malformed, off-region or oddly formatted in some way."""
+    chrom = rng.choice(['6', '6', 'chr6', 'Chr6', 'cChrhr6', '"6"', ' 6', '6 ', '06', '16', 'X', 'MT', '6\xa0', 'chrX', '', 'é6'])
+    position = rng.choice([str(rng.randrange(28_900_000, 33_600_000)), ' 30000000', '30000000 ', '3e7', '', '-1',
+                           str(rng.randrange(1, 10 ** 9)), '０30000000', '29000000', '33500000', '33500001'])
+    fields = [rng.choice(['rs1', 'i5', '#rs', 'rsid', '', 'é']), chrom, position, rng.choice(['AG', '--', '00', 'A', '', ' T C', 'é'])]
+    if rng.random() < 0.3:
+        fields.append(rng.choice(['G', '', 'x']))
+    line = (delimiter if rng.random() < 0.9 else rng.choice(['\t', ','])).join(fields)
+    if rng.random() < 0.2:
+        line = rng.choice(ODD_WHITESPACE) + rng.choice(['', '\t', ',']) + line
+    if rng.random() < 0.2:
+        line += rng.choice(ODD_WHITESPACE)
+    return line
+
+
+def fuzz_file(seed: int) -> str:
+    rng = random.Random(seed)
+    delimiter = rng.choice(['\t', ','])
+    prefix = rng.choice(['', 'chr', '"'])
+    per_chrom = rng.randrange(50, 3000) // 22
+    rows = []
+    for chrom in range(1, 23):
+        for position in sorted(rng.sample(range(1, 60_000_000), per_chrom + (300 if chrom == 6 else 0))):
+            if chrom == 6 and rng.random() < 0.3:
+                position = rng.randrange(29_000_000, 33_500_000)
+            field = f'"{chrom}"' if prefix == '"' else f"{prefix}{chrom}"
+            rows.append(delimiter.join([f"rs{rng.randrange(10 ** 7)}", field, str(position), 'AG']))
+    if rng.random() < 0.5:
+        rows.sort(key=lambda row: (int(row.split(delimiter)[1].strip('"').replace('chr', '')), int(row.split(delimiter)[2])))
+    for _ in range(rng.randrange(0, 60)):
+        rows.insert(rng.randrange(len(rows) + 1), odd_line(rng, delimiter))
+    header = delimiter.join(['rsid', 'chromosome', 'position', 'genotype'])
+    return '# header\n' + header + '\n' + '\n'.join(rows) + rng.choice(['', '\n', '\r\n'])
+
+
+def vendor_file(fmt: str, seed: int, rows: int = 20_000, shuffle: bool = False) -> str:
+    """23andMe / AncestryDNA / MyHeritage style export."""
+    rng = random.Random(seed)
+    chroms = [str(c) for c in range(1, 23)] + ['X', 'Y', 'MT']
+    records = []
+    for chrom in chroms:
+        positions = sorted(rng.sample(range(1, 60_000_000), rows // len(chroms)))
+        if chrom == '6':
+            positions = sorted(set(positions + rng.sample(range(29_000_000, 33_500_000), 500)))
+        for position in positions:
+            genotype = '--' if rng.random() < 0.01 else rng.choice('ACGT') + rng.choice('ACGT')
+            rsid = f"rs{rng.randrange(1, 10 ** 8)}" if rng.random() > 0.05 else f"i{rng.randrange(1, 10 ** 7)}"
+            records.append((rsid, chrom, position, genotype))
+    if shuffle:
+        rng.shuffle(records)
+    if fmt == '23andme':
+        return "# This data file generated by 23andMe\n# rsid\tchromosome\tposition\tgenotype\n" + \
+            ''.join(f"{r}\t{c}\t{p}\t{g}\n" for r, c, p, g in records)
+    if fmt == 'ancestry':
+        return "#AncestryDNA raw data download\nrsid\tchromosome\tposition\tallele1\tallele2\n" + \
+            ''.join(f"{r}\t{c}\t{p}\t{g[0]}\t{g[1]}\r\n" for r, c, p, g in records)
+    return 'RSID,CHROMOSOME,POSITION,RESULT\n' + ''.join(f"{r},{c},{p},{g}\n" for r, c, p, g in records)
+
+
+@pytest.mark.parametrize('seed', range(100))
+def test_fuzzed_files_parse_like_the_line_parser(seed):
+    text = fuzz_file(seed)
+    expected = line_parse(text)
+    assert stream_parse(text.encode(), random.Random(seed)) == expected
+    assert SERVICE.parse_hla_input(text) == expected
+
+
+@pytest.mark.parametrize('shuffle', [False, True])
+@pytest.mark.parametrize('fmt', ['23andme', 'ancestry', 'myheritage'])
+def test_vendor_files_plain_and_compressed(fmt, shuffle):
+    text = vendor_file(fmt, seed=len(fmt), shuffle=shuffle)
+    expected = line_parse(text)
+    assert len(expected) > 400
+
+    data = text.encode()
+    archive = io.BytesIO()
+    with zipfile.ZipFile(archive, 'w', zipfile.ZIP_DEFLATED) as z:
+        z.writestr('readme.pdf', b'x' * 10)
+        z.writestr('genome.txt', data)
+    for upload in (data, gzip.compress(data), archive.getvalue()):
+        assert SERVICE.parse_dna_file(io.BytesIO(upload), chunk_size=4096) == expected
+
+
+def test_parallel_scan_matches_serial():
+    text = vendor_file('23andme', seed=3, shuffle=True)
+    data = text.encode()
+    parser = SERVICE.stream_parser()
+    chunks = dna_file_chunks(io.BytesIO(data), 8192)
+    for chunk in chunks:
+        parser.feed(chunk)
+        if parser.scanning_all:
+            break
+    with ThreadPoolExecutor(4) as executor:
+        parser.feed_parallel(chunks, executor, range_bytes=16_384)
+    assert parser.close() == line_parse(text)
@@ -0,0 +1,82 @@
+import asyncio
+import json
+import re
+import uuid
+
+import pytest
+
+from services.cache_service import get_parse_cache
+from services.gemini_service import GeminiService
+
+
+@pytest.fixture
+def service(monkeypatch):
+    monkeypatch.setenv('GEMINI_API_KEY', 'test-key')
+    return GeminiService()
+
+
+def _pairs(n: int) -> list:
+    run = uuid.uuid4().hex  # Fresh answers, so the process-wide parse cache never answers
+    return [(f"Question {i}", f"Answer {i} {run}") for i in range(n)]
+
+
+def _scores(indices) -> str:
+    return json.dumps([dict({'index': i}, **{t: {'score': 50, 'evidence': 'x'} for t in GeminiService.TRAITS})
+                       for i in indices])
+
+
+def test_failed_model_call_marks_batch_unscored_without_splitting(service):
+    calls = []
+
+    def generate(prompt, generation_config, images=None):
+        calls.append(prompt)
+        return None  # Every model down
+
+    service._generate_with_fallback = generate
+    results = asyncio.run(service.parse_responses_batch(_pairs(20)))
+
+    assert len(calls) == 1
+    assert results == [service._unscored()] * 20
+
+
+def test_short_output_is_split_and_only_missing_answers_retried(service):
+    calls = []
+
+    def generate(prompt, generation_config, images=None):
+        calls.append(prompt)
+        count = len(re.findall(r'^\[\d+\] Question', prompt, re.M))
+        # First call comes back truncated after half the answers
+        return _scores(range(1, count // 2 + 1) if len(calls) == 1 else range(1, count + 1))
+
+    service._generate_with_fallback = generate
+    results = asyncio.run(service.parse_responses_batch(_pairs(10)))
+
+    assert len(calls) == 2
+    assert all(r['drive']['score'] == 50 for r in results)
+
+
+def test_repeated_answers_are_scored_once(service):
+    prompts = []
+
+    def generate(prompt, generation_config, images=None):
+        prompts.append(prompt)
+        return _scores(range(1, len(re.findall(r'^\[\d+\] Question', prompt, re.M)) + 1))
+
+    service._generate_with_fallback = generate
+    pairs = _pairs(3)
+    results = asyncio.run(service.parse_responses_batch(pairs + pairs[:2] + [pairs[0]]))
+
+    assert len(prompts) == 1
+    assert len(re.findall(r'^\[\d+\] Question', prompts[0], re.M)) == 3
+    assert len(results) == 6 and results[3] == results[0] and results[5] == results[0]
+
+
+def test_single_answer_counts_one_cache_miss(service):
+    single = json.dumps({t: {'score': 50, 'evidence': 'x'} for t in GeminiService.TRAITS})
+    service._generate_with_fallback = lambda prompt, generation_config, images=None: single
+    cache = get_parse_cache()
+    misses = cache.misses
+    result = asyncio.run(service.parse_responses_batch(_pairs(1)))
+
+    assert result[0]['drive']['score'] == 50
+    assert cache.misses == misses + 1
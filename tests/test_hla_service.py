@@ -0,0 +1,58 @@
+"""HLAPanel one-vs-many and block scoring against the pairwise calculate_hla_compatibility."""
+import logging
+
+import numpy as np
+import pytest
+
+from services.hla_service import HLAPanel, HLAService
+from services.match_service import compatibility_matrix
+
+from hla_data import random_hla_db
+
+SERVICE = HLAService()
+USERS = [f"u{i}" for i in range(40)]
+
+
+@pytest.fixture(autouse=True)
+def _quiet():
+    """calculate_hla_compatibility logs every call at INFO."""
+    logging.disable(logging.INFO)
+    yield
+    logging.disable(logging.NOTSET)
+
+
+def pairwise(db: dict, a: str, b: str) -> float:
+    if a not in db or b not in db:
+        return 50.0
+    return SERVICE.calculate_hla_compatibility(db[a], db[b])['compatibility_score']
+
+
+@pytest.mark.parametrize('seed', range(4))
+def test_one_to_many_matches_pairwise(seed):
+    db = random_hla_db(seed, USERS)
+    panel = HLAPanel(db.items())
+    for user_id in USERS:
+        scores = SERVICE.compatibility_one_to_many(panel, user_id, USERS)
+        assert list(scores) == [pairwise(db, user_id, other) for other in USERS], user_id
+
+
+@pytest.mark.parametrize('seed', range(4))
+def test_block_matches_one_to_many(seed):
+    db = random_hla_db(seed, USERS)
+    panel = HLAPanel(db.items())
+    rows, cols = USERS[:25], USERS[10:]
+    block = SERVICE.compatibility_block(panel, rows, cols)
+    expected = np.vstack([SERVICE.compatibility_one_to_many(panel, user_id, cols) for user_id in rows])
+    assert np.array_equal(block, expected)
+
+
+@pytest.mark.parametrize('block_size', [1, 7, 512])
+def test_cohort_matrix_hla_matches_pairwise(block_size):
+    users = USERS[:24]
+    db = random_hla_db(11, users)
+    profiles = {user_id: {'sins': {}} for user_id in users}
+    result = compatibility_matrix(users, profiles, {}, db, SERVICE, block_size=block_size)
+    for i, a in enumerate(users):
+        for j, b in enumerate(users):
+            if i != j:
+                assert result['hla'][i][j] == pairwise(db, a, b), (a, b)
@@ -0,0 +1,59 @@
+import asyncio
+import time
+
+from services.job_service import JobQueue
+from services.storage_service import create_storage
+
+
+def _job(job_id: str, status: str, age: float = 0.0, **fields) -> dict:
+    at = time.time() - age
+    return dict({'job_id': job_id, 'status': status, 'stage': status, 'progress': 0, 'payload': {'n': job_id},
+                 'result': None, 'error': None, 'created_at': at, 'updated_at': at}, **fields)
+
+
+async def _run_queue(table, seconds: float = 0.2, **kwargs) -> JobQueue:
+    async def runner(payload, progress):
+        await progress('working', 50)
+        return {'echo': payload['n']}
+
+    queue = JobQueue(table, runner, concurrency=2, stale_after=60, retention=3600, worker_id='host:1', **kwargs)
+    await queue.start()
+    await asyncio.sleep(seconds)
+    await queue.stop()
+    return queue
+
+
+def test_start_requeues_own_leftovers_and_stale_jobs_only():
+    table = create_storage('memory').table('jobs')
+    table['mine'] = _job('mine', 'running', worker='host:1', heartbeat_at=time.time())
+    table['stale'] = _job('stale', 'running', worker='host:2', heartbeat_at=time.time() - 120)
+    table['alive'] = _job('alive', 'running', worker='host:2', heartbeat_at=time.time())
+    table['queued'] = _job('queued', 'queued')
+
+    asyncio.run(_run_queue(table))
+
+    assert table['mine']['status'] == 'done' and table['mine']['result'] == {'echo': 'mine'}
+    assert table['stale']['status'] == 'done' and table['stale']['worker'] == 'host:1'
+    assert table['queued']['status'] == 'done'
+    assert table['alive']['status'] == 'running' and table['alive']['worker'] == 'host:2'
+
+
+def test_sweep_prunes_old_finished_jobs_and_picks_up_orphans():
+    table = create_storage('memory').table('jobs')
+    table['old'] = _job('old', 'done', age=7200)
+    table['recent'] = _job('recent', 'failed', age=60)
+
+    async def scenario():
+        async def runner(payload, progress):
+            return {}
+
+        queue = JobQueue(table, runner, stale_after=4, retention=3600, worker_id='host:1')
+        await queue.start()
+        assert 'old' not in table and 'recent' in table
+        # Queued by a worker that died before running it; the periodic sweep adopts it
+        table['orphan'] = _job('orphan', 'queued', age=10)
+        await asyncio.sleep(queue.heartbeat + 0.5)
+        await queue.stop()
+
+    asyncio.run(scenario())
+    assert table['orphan']['status'] == 'done'
@@ -0,0 +1,121 @@
+import random
+
+import pytest
+
+from services.hla_service import HLAService
+from services.match_service import MatchIndex, TopMatchLists
+from services.similarity_service import TRAITS
+from services.storage_service import create_storage
+
+from hla_data import random_hla_db
+
+K = 5
+
+
+def _profile(rng: random.Random, user_id: str) -> dict:
+    return {'name': user_id, 'sins': {t: {'score': round(rng.uniform(0, 20), 1)} for t in TRAITS if rng.random() < 0.9}}
+
+
+def _assert_lists_match_fresh_index(lists: TopMatchLists, profiles, images, hla_db):
+    reloaded = TopMatchLists(lists.table, lists.index, k=K)
+    reloaded._load_index()
+    assert (lists._holders, lists._floors) == (reloaded._holders, reloaded._floors)
+
+    fresh = MatchIndex(profiles, images, hla_db, HLAService())
+    for user_id in profiles.keys():
+        stored = lists.get(user_id)
+        live = fresh.top_matches(user_id, K)['matches']
+        assert [m['overall_score'] for m in stored] == [m['overall_score'] for m in live], user_id
+        live_by_id = {m['user_id']: m for m in live}
+        for match in stored:
+            if match['user_id'] in live_by_id:
+                assert match['components'] == live_by_id[match['user_id']]['components'], (user_id, match['user_id'])
+
+
+@pytest.mark.parametrize('backend', ['memory', 'sqlite'])
+@pytest.mark.parametrize('workers', [1, 2])
+@pytest.mark.parametrize('seed', range(3))
+def test_top_match_lists_match_a_fresh_index(seed, backend, workers, tmp_path):
+    """
+    Incrementally patched lists equal a live search, including genomes whose HLA
+    score depends on direction, also when batches alternate between workers.
+    """
+    rng = random.Random(seed)
+    storage = create_storage(backend, str(tmp_path / 'harmonia.db'))
+    profiles, images, hla_db = storage.table('profiles'), storage.table('images'), storage.table('hla')
+    user_ids = [f"u{i}" for i in range(60)]
+
+    def write(user_id, genomes):
+        profiles[user_id] = _profile(rng, user_id)
+        if rng.random() < 0.5:
+            images[user_id] = {'features': {'attractiveness': rng.randint(1, 10), 'quality_score': rng.choice([50, 70, 90])}}
+        if user_id in genomes:
+            hla_db[user_id] = genomes[user_id]
+        else:
+            hla_db.pop(user_id, None)
+
+    genomes = random_hla_db(seed, user_ids)
+    for user_id in user_ids:
+        write(user_id, genomes)
+    pool = [TopMatchLists(storage.table('top_matches'), MatchIndex(profiles, images, hla_db, HLAService()),
+                          k=K, batch_delay=0, worker_id=f"w{i}") for i in range(workers)]
+    lists = pool[0]
+    lists.apply(set(user_ids))
+    _assert_lists_match_fresh_index(lists, profiles, images, hla_db)
+
+    for round_ in range(4):
+        genomes = random_hla_db(seed * 100 + round_, user_ids + ['n0', 'n1'])
+        changed = set(rng.sample(user_ids, 6)) | {f"n{round_ % 2}"}
+        for user_id in changed:
+            write(user_id, genomes)
+        removed = rng.choice(sorted(set(user_ids) - changed))
+        profiles.pop(removed)
+        user_ids.remove(removed)
+        lists = pool[(round_ + 1) % workers]
+        lists.apply(changed | {removed})
+        _assert_lists_match_fresh_index(lists, profiles, images, hla_db)
+
+
+def test_one_worker_holds_the_updater_lease(tmp_path):
+    storage = create_storage('sqlite', str(tmp_path / 'harmonia.db'))
+    profiles = storage.table('profiles')
+    profiles['u0'] = {'name': 'u0', 'sins': {}}
+    a, b = (TopMatchLists(storage.table('top_matches'), MatchIndex(profiles, {}, {}, HLAService()),
+                          k=K, lease=30, worker_id=w) for w in ('a', 'b'))
+
+    assert a._hold_lease() and not b._hold_lease()
+    assert a.is_pending('u0') and b.is_pending('u0')  # Queued once, by the updater, for everyone
+    assert a._hold_lease() and not b._hold_lease()    # Renewed
+
+    lease = a.meta['updater']
+    a.meta['updater'] = dict(lease, expires=0)        # a stopped renewing
+    assert b._hold_lease() and not a._hold_lease()
+
+
+def test_patched_list_changed_elsewhere_is_queued_again(tmp_path):
+    storage = create_storage('sqlite', str(tmp_path / 'harmonia.db'))
+    lists = TopMatchLists(storage.table('top_matches'), MatchIndex({}, {}, {}, HLAService()), k=K)
+    lists.table['u0'] = [[50.0, 'u1', {}]]
+    read = {'u0': [[40.0, 'u1', {}]], 'u2': None}
+    assert not lists._write('u0', [[60.0, 'u1', {}]], read)
+    assert lists._write('u2', [[60.0, 'u1', {}]], read)
+    assert not lists._write('u2', [[70.0, 'u1', {}]], read)
+    assert lists.table['u0'] == [[50.0, 'u1', {}]] and lists.table['u2'] == [[60.0, 'u1', {}]]
+
+
+@pytest.mark.parametrize('seed', range(2))
+def test_kdtree_matches_brute_force(seed):
+    """The tree only narrows the candidates: results equal scoring everyone."""
+    pytest.importorskip('scipy')
+    rng = random.Random(seed)
+    user_ids = [f"u{i}" for i in range(3000)]
+    profiles = {uid: {'name': uid, 'sins': {t: {'score': round(rng.uniform(0, 20), 1)} for t in TRAITS}} for uid in user_ids}
+    images = {uid: {'features': {'attractiveness': rng.randint(1, 10), 'quality_score': rng.choice([50, 70, 90])}}
+              for uid in user_ids if rng.random() < 0.7}
+    hla_db = random_hla_db(seed, user_ids[:300])
+    tree = MatchIndex(profiles, images, hla_db, HLAService(), kdtree_min=1, shortlist=20)
+    brute = MatchIndex(profiles, images, hla_db, HLAService(), kdtree_min=10 ** 9)
+    for user_id in rng.sample(user_ids[:300], 10) + rng.sample(user_ids, 20):
+        found = tree.top_matches(user_id, 10)
+        assert found['method'] == 'kdtree'
+        assert found['matches'] == brute.top_matches(user_id, 10)['matches'], user_id
@@ -0,0 +1,44 @@
+import asyncio
+import json
+
+from services.response_pool_service import ResponsePool
+from services.storage_service import create_storage
+
+
+def _pool(tmp_path, generator, **kwargs) -> ResponsePool:
+    questions = {'questions': {'block': [{'id': f"q{i}", 'question': f"Question {i}?"} for i in range(4)]}}
+    path = tmp_path / 'questions.json'
+    path.write_text(json.dumps(questions))
+    return ResponsePool(create_storage('memory').table('pool'), generator, str(path), **kwargs)
+
+
+def test_failed_refill_pauses_refills(tmp_path):
+    calls = []
+
+    async def generator(question, tone):
+        calls.append((question, tone))
+        return None  # Model down
+
+    async def scenario():
+        pool = _pool(tmp_path, generator, per_key=2, concurrency=2)
+        await pool.warm()
+        assert len(calls) == 1 and pool.paused()
+        for i in range(4):
+            assert pool.take(f"Question {i}?", 'neutral') is None
+        await asyncio.sleep(0)
+        assert len(calls) == 1
+
+    asyncio.run(scenario())
+
+
+def test_pooled_candidates_keep_their_fields(tmp_path):
+    async def generator(question, tone):
+        return {'response': f"{question} {tone}", 'model_used': 'model-x'}
+
+    async def scenario():
+        pool = _pool(tmp_path, generator, per_key=2)
+        await pool.warm()
+        assert pool.size() == 4 * 3 * 2
+        return pool.take("question 1?", 'positive')
+
+    assert asyncio.run(scenario()) == {'response': "Question 1? positive", 'model_used': 'model-x'}
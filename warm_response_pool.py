@@ -0,0 +1,15 @@
+#!/usr/bin/env python3
+"""Pre-generate /api/generate-response answers into the shared store (use with STORAGE_BACKEND=sqlite)."""
+import asyncio
+import os
+
+from services.response_pool_service import ResponsePool
+
+if __name__ == "__main__":
+    import main
+
+    pool = ResponsePool(main.STORE.table("response_pool"), main._generate_pool_candidate, "data/felix_questions.json",
+                        per_key=main.Config.RESPONSE_POOL_PER_KEY, concurrency=main.Config.RESPONSE_POOL_CONCURRENCY)
+    print(f"🔥 Warming response pool ({os.getenv('STORAGE_BACKEND', 'memory')} storage)...")
+    asyncio.run(pool.warm())
+    print(f"✅ {pool.size()} answers pooled")